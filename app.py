@@ -10,18 +10,33 @@ import pandas as pd
 import os
 import sys
 import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
 
-# Cargar variables de entorno
-load_dotenv()
+# Streamlit vuelve a ejecutar este script en cada rerun: lo que está a nivel de
+# módulo se repite en cada interacción (los imports sí quedan en sys.modules)
 
-# Añadir src al path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+@st.cache_resource(show_spinner=False)
+def _load_env():
+    """Cargar variables de entorno desde .env (una sola vez por proceso)."""
+    load_dotenv()
+
+_load_env()
+
+# Añadir src y la raíz del proyecto al path sin duplicar entradas en cada rerun
+for _path in (os.path.join(os.path.dirname(__file__), 'src'), os.path.dirname(__file__)):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
 
 from src.business_processor import BusinessDataProcessor
-from src.output_writer import OutputWriter
+from src.output_writer import OutputWriter, EXCEL_NA_STRINGS, EXCEL_READ_ENGINE, excel_row_count, read_xlsx_records
+from src.utils import scan_excel_files
+from pre_merge import compare_with_existing, save_filtered_output
+from post_merge_manager import move_merged_to_input, cleanup_old_files
 
 # Configuración de la página
 st.set_page_config(
@@ -38,6 +53,10 @@ if 'search_results' not in st.session_state:
     st.session_state.search_results = None
 if 'processed_data' not in st.session_state:
     st.session_state.processed_data = None
+if 'processed_df' not in st.session_state:
+    st.session_state.processed_df = None
+if 'output_df' not in st.session_state:
+    st.session_state.output_df = None
 if 'output_file' not in st.session_state:
     st.session_state.output_file = None
 if 'merge_completed' not in st.session_state:
@@ -46,6 +65,7 @@ if 'used_neighborhoods' not in st.session_state:
     st.session_state.used_neighborhoods = {}
 
 # ===== CONFIGURACIÓN DE AUTENTICACIÓN =====
+@st.cache_data
 def get_auth_config():
     """Obtiene la configuración de autenticación desde variables de entorno o valores por defecto."""
 
@@ -54,42 +74,39 @@ def get_auth_config():
     auth_passwords = os.getenv('AUTH_PASSWORDS', 'admin123')  # Lista separada por comas
     auth_names = os.getenv('AUTH_NAMES', 'Administrador')  # Lista separada por comas
 
-    # Convertir a listas
-    usernames = [u.strip() for u in auth_users.split(',')]
-    passwords = [p.strip() for p in auth_passwords.split(',')]
-    names = [n.strip() for n in auth_names.split(',')]
-
-    # Asegurar que todas las listas tengan la misma longitud
-    min_length = min(len(usernames), len(passwords), len(names))
-    usernames = usernames[:min_length]
-    passwords = passwords[:min_length]
-    names = names[:min_length]
+    # zip recorta a la lista más corta, igual que antes con min_length
+    triples = zip(auth_users.split(','), auth_passwords.split(','), auth_names.split(','))
 
     # Crear diccionario de credenciales
     credentials = {
-        "usernames": {}
-    }
-
-    for i, username in enumerate(usernames):
-        credentials["usernames"][username] = {
-            "name": names[i] if i < len(names) else username,
-            "password": passwords[i] if i < len(passwords) else "password"
+        "usernames": {
+            u.strip(): {"name": n.strip(), "password": p.strip()}
+            for u, p, n in triples
         }
+    }
 
-    return credentials
-
-# Inicializar autenticador
-auth_config = get_auth_config()
-authenticator = stauth.Authenticate(
-    auth_config,
-    "marketing_script_db",
-    "auth_key_unique_12345",
-    cookie_expiry_days=1
-)
-
-def load_css():
-    """Cargar estilos CSS personalizados."""
-    st.markdown("""
+    # Hashear con bcrypt una sola vez por proceso. st.cache_data devuelve una
+    # copia en cada llamada: Authenticate modifica el diccionario (estado de
+    # login, intentos fallidos) y no debe compartirse entre sesiones
+    return stauth.Hasher.hash_passwords(credentials)
+
+def _build_authenticator():
+    """Crea el autenticador de la sesión actual.
+
+    No se cachea con st.cache_resource: el CookieManager interno lee las
+    cookies del navegador de cada sesión al construirse y no debe compartirse.
+    Lo costoso (hashear contraseñas) ya está cacheado en get_auth_config().
+    """
+    return stauth.Authenticate(
+        get_auth_config(),
+        "marketing_script_db",
+        "auth_key_unique_12345",
+        cookie_expiry_days=1,
+        auto_hash=False
+    )
+
+# Estilos de la app (constante: se define una sola vez al importar)
+_CSS = """
     <style>
     .main-header {
         font-size: 2.5rem;
@@ -131,167 +148,251 @@ def load_css():
         margin: 1rem 0;
     }
     </style>
-    """, unsafe_allow_html=True)
+"""
+
+def load_css():
+    """Cargar estilos CSS personalizados.
+
+    Se inyecta en cada rerun: Streamlit elimina de la página los elementos
+    que no se vuelven a renderizar, así que no se puede hacer una sola vez.
+    """
+    st.markdown(_CSS, unsafe_allow_html=True)
+
+def _scan_excels(dir_path: str) -> list:
+    """Rutas de los .xlsx/.xls de un directorio en una sola pasada de os.scandir."""
+    return [entry.path for entry in scan_excel_files(dir_path)]
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_excels(dir_path: str, fingerprint: tuple) -> tuple:
+    """Listado cacheado; `fingerprint` (mtime del directorio) cambia al agregar o quitar archivos."""
+    return tuple(_scan_excels(dir_path))
+
+def _list_excels(subdir: str) -> list:
+    """Lista los Excel de data/<subdir>. Compartido por todas las páginas para escanear una sola vez."""
+    dir_path = f"data/{subdir}"
+    return list(_cached_excels(dir_path, _dir_fingerprint(dir_path)))
+
+def _invalidate_file_listings():
+    """Invalida las caches de directorios tras escribir o mover archivos."""
+    _cached_excels.clear()
+
+@st.cache_resource
+def _ensure_data_dirs():
+    """Crear los directorios de datos (una sola vez por proceso)."""
+    for dir_path in ('data/input', 'data/output', 'data/merged'):
+        Path(dir_path).mkdir(parents=True, exist_ok=True)
+
+def _dir_fingerprint(*dirs):
+    """mtime de cada directorio: solo cambia al agregar, borrar o renombrar archivos."""
+    fingerprint = []
+    for dir_path in dirs:
+        try:
+            fingerprint.append(os.stat(dir_path).st_mtime_ns)
+        except FileNotFoundError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
 
 def check_environment():
     """Verificar que el entorno esté configurado correctamente."""
     issues = []
 
-    # Verificar API key
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        issues.append("❌ GOOGLE_API_KEY no encontrada en variables de entorno")
-
-    # Verificar directorios
-    required_dirs = ['data/input', 'data/output', 'data/merged']
-    for dir_path in required_dirs:
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path, exist_ok=True)
+    # Verificar archivos existentes: mismo listado cacheado que usan las páginas
+    # (un stat por directorio si nada cambió)
+    input_files = len(_list_excels('input'))
+    output_files = len(_list_excels('output'))
 
-    # Verificar archivos existentes
-    input_files = list(Path('data/input').glob('*.xlsx')) + list(Path('data/input').glob('*.xls'))
-    output_files = list(Path('data/output').glob('*.xlsx')) + list(Path('data/output').glob('*.xls'))
+    api_key_ok = bool(os.getenv('GOOGLE_API_KEY'))
+    if not api_key_ok:
+        issues.append("❌ GOOGLE_API_KEY no encontrada en variables de entorno")
 
     return {
-        'api_key_ok': bool(api_key),
-        'input_files': len(input_files),
-        'output_files': len(output_files),
+        'api_key_ok': api_key_ok,
+        'input_files': input_files,
+        'output_files': output_files,
         'issues': issues
     }
 
+@st.cache_data(show_spinner=False)
+def _excel_row_count(path: str, mtime: float, size: int) -> int:
+    """Cuenta registros de un Excel sin parsear sus celdas.
+
+    mtime y size solo forman parte de la clave de cache, para invalidarla
+    cuando el archivo cambia.
+    """
+    return excel_row_count(path)
+
+@lru_cache(maxsize=256)
+def _fmt_mtime(ts: float) -> str:
+    """Fecha de modificación legible. lru_cache y no st.cache_data: hashear y
+    copiar el resultado costaría más que el propio strftime."""
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _load_output_records(path: str, mtime: float) -> list:
+    """Lee un Excel de resultados como lista de registros, una vez por versión del archivo."""
+    return read_xlsx_records(path)
+
+@st.cache_data(show_spinner=False)
+def _df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Serializa un DataFrame a CSV (utf-8), cacheado entre reruns."""
+    return df.to_csv(index=False).encode('utf-8')
+
+# Barrios por ciudad en Colombia (para variar las búsquedas)
+_NEIGHBORHOODS = {
+    # Bogotá
+    "bogotá": ("Chico", "Chapinero", "Cedritos", "Usaquén", "Salitre", "Centro", "Teusaquillo",
+              "Zona Rosa", "Parque de la 93", "La Candelaria", "Santa Fe", "San Cristóbal",
+              "Kennedy", "Bosa", "Suba", "Engativá", "Fontibón", "Barrios Unidos", "Puente Aranda"),
+
+    # Medellín
+    "medellín": ("El Poblado", "Laureles", "Centro", "Envigado", "Sabaneta", "Itagüí",
+                "Belén", "Robledo", "Aranjuez", "Manrique", "Castilla", "Doce de Octubre",
+                "Villa Hermosa", "Buenos Aires", "La América", "San Javier", "La Candelaria"),
+
+    # Cali
+    "cali": ("San Fernando", "Centro", "Santa Monica", "Tequendama", "Granada", "Versalles",
+            "San Antonio", "La Flora", "Pance", "Ciudad Jardín", "El Peñón", "Alfonso López",
+            "La Base", "El Ingenio", "El Piloto", "La Rivera", "El Refugio"),
+
+    # Barranquilla
+    "barranquilla": ("Centro", "Alto Prado", "El Prado", "Riomar", "La Castellana", "Paseo Bolívar",
+                    "Villa Country", "El Country", "Ciudad Jardín", "La Cumbre", "Los Nogales",
+                    "San Vicente", "La Sierra", "El Recreo", "Villa Santos", "Los Alpes"),
+
+    # Cartagena
+    "cartagena": ("Centro Histórico", "Bocagrande", "Laguito", "Castillogrande", "El Laguito",
+                 "Pie de la Popa", "Getsemaní", "San Diego", "La Matuna", "Marbella",
+                 "El Cabrero", "Crespo", "Olaya Herrera", "Torices", "Ararca"),
+
+    # Bucaramanga
+    "bucaramanga": ("Centro", "Cabecera", "La Concordia", "El Prado", "Floridablanca",
+                   "Girón", "Piedecuesta", "Zona Rosa", "La Cumbre", "Altos de San Ignacio",
+                   "Ciudadela Real de Minas", "El Bosque", "La Joya", "San Alonso",
+                   "La Flora", "El Carmen", "La Victoria", "San Francisco", "La Paz",
+                   "Villa del Prado", "El Jardín", "La Esperanza", "San Miguel", "La Rivera"),
+
+    # Pereira
+    "pereira": ("Centro", "Circular", "Cuba", "El Oso", "Dosquebradas", "La Florida",
+               "Villarestrepo", "San Nicolás", "Alfonso López", "El Rocío", "Villa Santana"),
+
+    # Santa Marta
+    "santa marta": ("Centro Histórico", "El Rodadero", "Bello Horizonte", "Pozos Colorados",
+                   "Mamatoco", "Gaira", "Minca", "Taganga", "Palomino", "Buritaca"),
+
+    # Ibagué
+    "ibagué": ("Centro", "San Isidro", "La Pola", "El Salado", "Villa Restrepo", "La Macedonia",
+              "El Jardín", "Alfonso López", "La Esperanza", "San Antonio", "El Totumo"),
+
+    # Pasto
+    "pasto": ("Centro", "San Vicente", "Catambuco", "Alfonso López", "La Laguna",
+             "El Tejar", "San Andrés", "La Florida", "El Batán", "El Calvario"),
+
+    # Manizales
+    "manizales": ("Centro", "Palogrande", "La Sultana", "Chipre", "La Linda",
+                 "El Cable", "La Enea", "La Castellana", "Alfonso López", "La Aurora"),
+
+    # Villavicencio
+    "villavicencio": ("Centro", "La Esperanza", "Porfía", "Alfonso López", "La Paz",
+                     "El Recreo", "Villa del Prado", "La Libertad", "El Dorado"),
+
+    # Montería
+    "montería": ("Centro", "La Castellana", "El Recreo", "Villa Nueva", "La Gloria",
+                "El Dorado", "San José", "La Esperanza", "Alfonso López"),
+
+    # Valledupar
+    "valledupar": ("Centro", "Villa María", "La Nevada", "Villa Germania", "Alfonso López",
+                  "La Esperanza", "Villa del Rosario", "El Jardín", "La Paz"),
+
+    # Popayán
+    "popayán": ("Centro", "San José", "Alfonso López", "La Esperanza", "El Calvario",
+               "La Laguna", "El Bolo", "La Florida", "San Francisco"),
+
+    # Neiva
+    "neiva": ("Centro", "Villa del Prado", "La Esperanza", "Alfonso López", "El Recreo",
+             "La Toma", "El Porvenir", "San Antonio", "La Libertad"),
+
+    # Armenia
+    "armenia": ("Centro", "La Castellana", "El Recreo", "Alfonso López", "La Esperanza",
+               "Villa Flora", "La Paz", "El Jardín", "San Antonio")
+}
+_NEIGHBORHOOD_KEYS = tuple(_NEIGHBORHOODS)
+
+# Barrios genéricos comunes si no se reconoce la ciudad
+_GENERIC_NEIGHBORHOODS = ("Centro", "Norte", "Sur", "Este", "Oeste", "Zona Rosa", "Plaza Principal",
+                          "Parque Central", "Alfonso López", "La Esperanza", "El Recreo", "Villa Nueva")
+
 def get_city_neighborhoods(city):
     """Obtener lista de barrios para una ciudad específica."""
     city_lower = city.lower().strip()
 
-    # Diccionario de barrios por ciudad en Colombia
-    neighborhoods = {
-        # Bogotá
-        "bogotá": ["Chico", "Chapinero", "Cedritos", "Usaquén", "Salitre", "Centro", "Teusaquillo",
-                  "Zona Rosa", "Parque de la 93", "La Candelaria", "Santa Fe", "San Cristóbal",
-                  "Kennedy", "Bosa", "Suba", "Engativá", "Fontibón", "Barrios Unidos", "Puente Aranda"],
-
-        # Medellín
-        "medellín": ["El Poblado", "Laureles", "Centro", "Envigado", "Sabaneta", "Itagüí",
-                    "Belén", "Robledo", "Aranjuez", "Manrique", "Castilla", "Doce de Octubre",
-                    "Villa Hermosa", "Buenos Aires", "La América", "San Javier", "La Candelaria"],
-
-        # Cali
-        "cali": ["San Fernando", "Centro", "Santa Monica", "Tequendama", "Granada", "Versalles",
-                "San Antonio", "La Flora", "Pance", "Ciudad Jardín", "El Peñón", "Alfonso López",
-                "La Base", "El Ingenio", "El Piloto", "La Rivera", "El Refugio"],
-
-        # Barranquilla
-        "barranquilla": ["Centro", "Alto Prado", "El Prado", "Riomar", "La Castellana", "Paseo Bolívar",
-                        "Villa Country", "El Country", "Ciudad Jardín", "La Cumbre", "Los Nogales",
-                        "San Vicente", "La Sierra", "El Recreo", "Villa Santos", "Los Alpes"],
-
-        # Cartagena
-        "cartagena": ["Centro Histórico", "Bocagrande", "Laguito", "Castillogrande", "El Laguito",
-                     "Pie de la Popa", "Getsemaní", "San Diego", "La Matuna", "Marbella",
-                     "El Cabrero", "Crespo", "Olaya Herrera", "Torices", "Ararca"],
-
-        # Bucaramanga
-        "bucaramanga": ["Centro", "Cabecera", "La Concordia", "El Prado", "Floridablanca",
-                       "Girón", "Piedecuesta", "Zona Rosa", "La Cumbre", "Altos de San Ignacio",
-                       "Ciudadela Real de Minas", "El Bosque", "La Joya", "San Alonso",
-                       "La Flora", "El Carmen", "La Victoria", "San Francisco", "La Paz",
-                       "Villa del Prado", "El Jardín", "La Esperanza", "San Miguel", "La Rivera"],
-
-        # Pereira
-        "pereira": ["Centro", "Circular", "Cuba", "El Oso", "Dosquebradas", "La Florida",
-                   "Villarestrepo", "San Nicolás", "Alfonso López", "El Rocío", "Villa Santana"],
-
-        # Santa Marta
-        "santa marta": ["Centro Histórico", "El Rodadero", "Bello Horizonte", "Pozos Colorados",
-                       "Mamatoco", "Gaira", "Minca", "Taganga", "Palomino", "Buritaca"],
-
-        # Ibagué
-        "ibagué": ["Centro", "San Isidro", "La Pola", "El Salado", "Villa Restrepo", "La Macedonia",
-                  "El Jardín", "Alfonso López", "La Esperanza", "San Antonio", "El Totumo"],
-
-        # Pasto
-        "pasto": ["Centro", "San Vicente", "Catambuco", "Alfonso López", "La Laguna",
-                 "El Tejar", "San Andrés", "La Florida", "El Batán", "El Calvario"],
-
-        # Manizales
-        "manizales": ["Centro", "Palogrande", "La Sultana", "Chipre", "La Linda",
-                     "El Cable", "La Enea", "La Castellana", "Alfonso López", "La Aurora"],
-
-        # Villavicencio
-        "villavicencio": ["Centro", "La Esperanza", "Porfía", "Alfonso López", "La Paz",
-                         "El Recreo", "Villa del Prado", "La Libertad", "El Dorado"],
-
-        # Montería
-        "montería": ["Centro", "La Castellana", "El Recreo", "Villa Nueva", "La Gloria",
-                    "El Dorado", "San José", "La Esperanza", "Alfonso López"],
-
-        # Valledupar
-        "valledupar": ["Centro", "Villa María", "La Nevada", "Villa Germania", "Alfonso López",
-                      "La Esperanza", "Villa del Rosario", "El Jardín", "La Paz"],
-
-        # Popayán
-        "popayán": ["Centro", "San José", "Alfonso López", "La Esperanza", "El Calvario",
-                   "La Laguna", "El Bolo", "La Florida", "San Francisco"],
-
-        # Neiva
-        "neiva": ["Centro", "Villa del Prado", "La Esperanza", "Alfonso López", "El Recreo",
-                 "La Toma", "El Porvenir", "San Antonio", "La Libertad"],
-
-        # Armenia
-        "armenia": ["Centro", "La Castellana", "El Recreo", "Alfonso López", "La Esperanza",
-                   "Villa Flora", "La Paz", "El Jardín", "San Antonio"]
-    }
+    # Coincidencia exacta: una sola búsqueda en el diccionario
+    hoods = _NEIGHBORHOODS.get(city_lower)
+    if hoods:
+        return hoods
 
     # Buscar coincidencias parciales
-    for city_key, hoods in neighborhoods.items():
+    for city_key in _NEIGHBORHOOD_KEYS:
         if city_key in city_lower or city_lower in city_key:
-            return hoods
+            return _NEIGHBORHOODS[city_key]
 
     # Si no encuentra la ciudad específica, devolver barrios genéricos comunes
-    return ["Centro", "Norte", "Sur", "Este", "Oeste", "Zona Rosa", "Plaza Principal",
-            "Parque Central", "Alfonso López", "La Esperanza", "El Recreo", "Villa Nueva"]
-
-def run_search(city, business_type, target_count, scan_emails, progress_callback=None):
+    return _GENERIC_NEIGHBORHOODS
+
+@st.cache_resource(max_entries=8)
+def _get_processor(api_key, rate_limit_per_minute):
+    """Procesador compartido entre búsquedas y sesiones (mismo estado de rate limit).
+
+    El número de workers no forma parte de la clave: se pasa en cada
+    process_batch, así cambiarlo no crea otro cliente con su propio rate limit.
+    """
+    return BusinessDataProcessor(
+        api_key=api_key,
+        humanize=False,
+        rate_limit_per_minute=rate_limit_per_minute
+    )
+
+@st.cache_resource
+def _get_writer():
+    """OutputWriter compartido; no guarda estado entre llamadas."""
+    return OutputWriter(humanize=False)
+
+def run_search(city, business_type, target_count, scan_emails, progress_callback=None,
+               workers=8, rate_limit_per_minute=600, save_excel=True):
     """Ejecutar búsqueda de empresas en un hilo separado."""
     try:
-        processor = BusinessDataProcessor(
-            api_key=os.getenv('GOOGLE_API_KEY'),
-            workers=1,
-            humanize=False,
-            rate_limit_per_minute=600
-        )
+        # Las llamadas a Places y el scraping son I/O: varios workers en paralelo,
+        # el cliente de Places mantiene el rate limit global entre hilos
+        processor = _get_processor(os.getenv('GOOGLE_API_KEY'), rate_limit_per_minute)
 
         if progress_callback:
             progress_callback("🔍 Buscando empresas con información de contacto...")
 
         # Generar variación de búsqueda por barrios para evitar resultados duplicados
-        neighborhoods = get_city_neighborhoods(city)
-        
-        # Sistema inteligente de selección de barrios para maximizar variedad
-        used_neighborhoods = getattr(st.session_state, 'used_neighborhoods', {}).get(city.lower(), [])
-        
-        # Filtrar barrios que ya se usaron recientemente (últimas 5 búsquedas)
-        available_neighborhoods = [n for n in neighborhoods if n not in used_neighborhoods[-5:]]
-        
-        # Si no quedan barrios disponibles, resetear la lista
-        if not available_neighborhoods:
-            available_neighborhoods = neighborhoods
-            used_neighborhoods = []
-        
         # 40% de probabilidad de búsqueda sin barrio específico
         if random.random() < 0.4:
             search_variation = ""  # Sin barrio específico
             variation_type = "general"
         else:
+            neighborhoods = get_city_neighborhoods(city)
+
+            # Sistema inteligente de selección de barrios para maximizar variedad:
+            # solo se recuerdan los últimos 5 barrios por ciudad (deque con maxlen)
+            used_neighborhoods = (st.session_state.setdefault('used_neighborhoods', {})
+                                  .setdefault(city.lower(), deque(maxlen=5)))
+            recent = set(used_neighborhoods)
+
+            # Filtrar barrios que ya se usaron recientemente (últimas 5 búsquedas);
+            # si no queda ninguno, resetear la lista
+            available_neighborhoods = [n for n in neighborhoods if n not in recent]
+            if not available_neighborhoods:
+                available_neighborhoods = neighborhoods
+                used_neighborhoods.clear()
+
             search_variation = random.choice(available_neighborhoods)
             variation_type = f"barrio: {search_variation}"
-            
-            # Registrar el barrio usado
-            if city.lower() not in st.session_state.get('used_neighborhoods', {}):
-                st.session_state.used_neighborhoods = {}
-            if city.lower() not in st.session_state.used_neighborhoods:
-                st.session_state.used_neighborhoods[city.lower()] = []
-            st.session_state.used_neighborhoods[city.lower()].append(search_variation)
+
+            # Registrar el barrio usado (el más antiguo sale solo al superar 5)
+            used_neighborhoods.append(search_variation)
 
         if progress_callback:
             progress_callback(f"🔍 Buscando en {variation_type}...")
@@ -313,10 +414,22 @@ def run_search(city, business_type, target_count, scan_emails, progress_callback
             items=results,
             scan_emails=scan_emails,
             delay=0,
-            city=city
+            city=city,
+            workers=min(workers, target_count)
         )
 
-        # Generar archivo de salida
+        # Generar archivo de salida (solo si se va a usar en duplicados/merge)
+        if not save_excel:
+            return {
+                "success": True,
+                "results": results,
+                "processed_data": processed_data,
+                "processed_df": pd.DataFrame(processed_data),
+                "output_df": None,
+                "output_file": None,
+                "count": len(processed_data)
+            }
+
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         city_clean = city.replace(",", "").replace(" ", "_")
         type_clean = business_type.replace(" ", "_")
@@ -325,16 +438,22 @@ def run_search(city, business_type, target_count, scan_emails, progress_callback
 
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        processor.output_writer.write_to_excel(
+        written_df = processor.output_writer.write_to_excel(
             data=processed_data,
             filepath=output_path,
             use_template_columns=True
         )
+        _invalidate_file_listings()
 
         return {
             "success": True,
             "results": results,
             "processed_data": processed_data,
+            # DataFrame construido una sola vez; las páginas lo reutilizan
+            "processed_df": pd.DataFrame(processed_data),
+            # Lo mismo que se obtendría releyendo output_file (columnas del
+            # template, URLs filtradas, textos NA de Excel como NaN)
+            "output_df": written_df.where(~written_df.isin(EXCEL_NA_STRINGS)),
             "output_file": output_path,
             "count": len(processed_data)
         }
@@ -342,29 +461,30 @@ def run_search(city, business_type, target_count, scan_emails, progress_callback
     except Exception as e:
         return {"error": str(e)}
 
-def run_pre_merge(output_file, progress_callback=None):
-    """Ejecutar verificación de duplicados."""
-    try:
-        # Importar funciones de pre_merge
-        sys.path.insert(0, os.path.dirname(__file__))
-        from pre_merge import find_input_excel, compare_with_existing, save_filtered_output
+def run_pre_merge(output_file, df_new=None, progress_callback=None):
+    """Ejecutar verificación de duplicados.
 
-        input_file = find_input_excel()
-        if not input_file:
+    Si se pasa `df_new` (el DataFrame que se escribió en `output_file`) se usa
+    directamente en vez de volver a leer el archivo.
+    """
+    try:
+        input_files = _list_excels("input")
+        if not input_files:
             return {"error": "No se encontró Excel maestro en data/input/"}
+        input_file = input_files[0]
 
         if progress_callback:
             progress_callback("🔍 Comparando con datos existentes...")
 
-        # Leer datos nuevos
-        df_new = pd.read_excel(output_file)
-        new_data = df_new.to_dict('records')
+        # Datos nuevos (el DataFrame se compara directamente, sin pasar por dicts)
+        if df_new is None:
+            df_new = pd.read_excel(output_file, engine=EXCEL_READ_ENGINE)
 
         # Comparar
-        nuevos, duplicados, info_duplicados = compare_with_existing(new_data, input_file)
+        nuevos, duplicados, info_duplicados = compare_with_existing(df_new, input_file)
 
         result = {
-            "total_analyzed": len(new_data),
+            "total_analyzed": len(df_new),
             "new_records": len(nuevos),
             "duplicate_records": len(duplicados),
             "duplicates_info": info_duplicados,
@@ -376,31 +496,27 @@ def run_pre_merge(output_file, progress_callback=None):
         if duplicados:
             filtered_path = save_filtered_output(output_file, nuevos, "_sin_duplicados")
             result["filtered_file"] = filtered_path
+            _invalidate_file_listings()
 
         return result
 
     except Exception as e:
         return {"error": str(e)}
 
-def run_merge(output_file, progress_callback=None):
-    """Ejecutar merge final."""
+def run_merge(new_data, progress_callback=None):
+    """Ejecutar merge final con los registros ya cargados (lista de dicts)."""
     try:
-        writer = OutputWriter(humanize=False)
+        writer = _get_writer()
 
         if progress_callback:
             progress_callback("🔄 Iniciando merge...")
 
-        # Leer datos
-        df_new = pd.read_excel(output_file)
-        new_data = df_new.to_dict('records')
-
         # Encontrar archivo maestro
-        input_dir = Path("data/input")
-        excel_files = list(input_dir.glob("*.xlsx")) + list(input_dir.glob("*.xls"))
+        excel_files = _list_excels("input")
         if not excel_files:
             return {"error": "No se encontró Excel maestro en data/input/"}
 
-        input_file = str(excel_files[0])
+        input_file = excel_files[0]
 
         # Hacer merge
         merged_path, renamed_original = writer.merge_into_existing_excel(
@@ -408,6 +524,7 @@ def run_merge(output_file, progress_callback=None):
             data=new_data,
             key_priority=['Pagina Web', 'Nombre']
         )
+        _invalidate_file_listings()
 
         if merged_path and renamed_original:
             return {
@@ -424,6 +541,7 @@ def run_merge(output_file, progress_callback=None):
 def main():
     # ===== AUTENTICACIÓN =====
     try:
+        authenticator = _build_authenticator()
         authenticator.login('main')
     except Exception as e:
         st.error(f"Error de autenticación: {e}")
@@ -438,6 +556,7 @@ def main():
         return
 
     # Usuario autenticado - mostrar aplicación
+    _ensure_data_dirs()
     load_css()
 
     # ===== HEADER CON LOGOUT =====
@@ -469,10 +588,7 @@ def main():
         st.markdown("---")
 
         # Navegación
-        page = st.radio(
-            "Navegación:",
-            ["🏠 Inicio", "🔍 Buscar Empresas", "🔄 Verificar Duplicados", "📊 Merge Final", "📁 Archivos"]
-        )
+        page = st.radio("Navegación:", list(_PAGES))
 
         st.markdown("---")
         st.markdown(f"**Archivos encontrados:**")
@@ -480,18 +596,9 @@ def main():
         st.markdown(f"📤 Output: {env_status['output_files']}")
 
     # ===== CONTENIDO PRINCIPAL =====
-    if page == "🏠 Inicio":
-        show_home_page()
-    elif page == "🔍 Buscar Empresas":
-        show_search_page()
-    elif page == "🔄 Verificar Duplicados":
-        show_duplicates_page()
-    elif page == "📊 Merge Final":
-        show_merge_page()
-    elif page == "📁 Archivos":
-        show_files_page()
-
-def show_home_page():
+    _PAGES[page](env_status)
+
+def show_home_page(env):
     st.markdown('<h1 class="main-header">🏠 Marketing Script Dashboard</h1>', unsafe_allow_html=True)
 
     st.markdown("""
@@ -525,13 +632,13 @@ def show_home_page():
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        st.metric("Archivos Input", check_environment()['input_files'])
+        st.metric("Archivos Input", env['input_files'])
 
     with col2:
-        st.metric("Archivos Output", check_environment()['output_files'])
+        st.metric("Archivos Output", env['output_files'])
 
     with col3:
-        api_status = "✅ OK" if check_environment()['api_key_ok'] else "❌ Faltante"
+        api_status = "✅ OK" if env['api_key_ok'] else "❌ Faltante"
         st.metric("API Key", api_status)
 
 def show_search_page():
@@ -553,6 +660,14 @@ def show_search_page():
         with col2:
             target_count = st.number_input("📊 Cantidad de Empresas", min_value=1, max_value=100, value=10, key="count")
             scan_emails = st.checkbox("📧 Escanear emails en páginas web", value=True, key="scan_emails")
+            save_excel = st.checkbox("💾 Guardar como XLSX (necesario para merge)", value=True, key="save_excel")
+
+        with st.expander("⚙️ Opciones avanzadas"):
+            adv_col1, adv_col2 = st.columns(2)
+            with adv_col1:
+                workers = st.number_input("🧵 Workers en paralelo", min_value=1, max_value=16, value=8, key="workers")
+            with adv_col2:
+                rate_limit = st.number_input("⏱️ Límite de peticiones por minuto", min_value=10, max_value=600, value=600, step=10, key="rate_limit")
 
         submitted = st.form_submit_button("🚀 Iniciar Búsqueda", use_container_width=True)
 
@@ -567,7 +682,9 @@ def show_search_page():
 
         # Ejecutar búsqueda
         result = run_search(city, business_type, target_count, scan_emails,
-                          lambda msg: status_text.text(msg))
+                          lambda msg: status_text.text(msg),
+                          workers=int(workers), rate_limit_per_minute=int(rate_limit),
+                          save_excel=save_excel)
 
         if "error" in result:
             st.error(f"❌ Error: {result['error']}")
@@ -579,8 +696,13 @@ def show_search_page():
         # Guardar en session state
         st.session_state.search_results = result['results']
         st.session_state.processed_data = result['processed_data']
+        st.session_state.processed_df = result['processed_df']
+        st.session_state.output_df = result['output_df']
         st.session_state.output_file = result['output_file']
 
+        if not result['output_file']:
+            st.info("ℹ️ Resultados sin guardar en XLSX: para verificar duplicados y hacer merge activa 'Guardar como XLSX'")
+
         # Mostrar resumen
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -593,16 +715,13 @@ def show_search_page():
         # Mostrar datos
         if result['processed_data']:
             st.markdown("### 📋 Resultados de la Búsqueda")
-            df = pd.DataFrame(result['processed_data'])
-            # Reemplazar valores vacíos/NaN con "N/A" para mejor visualización
-            df = df.fillna("N/A")
-            df = df.replace("", "N/A")
-            # Asegurar que los tipos de datos sean strings para evitar ".0" en números
-            df = df.astype(str)
+            df = result['processed_df']
+            # Un solo paso: todo a string (evita ".0" en números) y vacíos/NaN como "N/A"
+            df = df.astype(str).where(df.notna() & df.ne(""), "N/A")
             st.dataframe(df, use_container_width=True)
 
             # Botón de descarga
-            csv = df.to_csv(index=False).encode('utf-8')
+            csv = _df_to_csv_bytes(df)
             st.download_button(
                 label="📥 Descargar CSV",
                 data=csv,
@@ -622,7 +741,7 @@ def show_duplicates_page():
 
     if st.button("🔍 Verificar Duplicados", use_container_width=True):
         with st.spinner("Verificando duplicados..."):
-            result = run_pre_merge(st.session_state.output_file)
+            result = run_pre_merge(st.session_state.output_file, st.session_state.output_df)
 
         if "error" in result:
             st.error(f"❌ Error: {result['error']}")
@@ -675,13 +794,13 @@ def show_merge_page():
         return
 
     # Verificar archivos
-    input_files = list(Path('data/input').glob('*.xlsx')) + list(Path('data/input').glob('*.xls'))
+    input_files = _list_excels('input')
     if not input_files:
         st.error("❌ No se encontró archivo Excel maestro en data/input/")
         st.info("💡 Coloca tu archivo Excel maestro en la carpeta data/input/")
         return
 
-    master_file = str(input_files[0])
+    master_file = input_files[0]
     st.markdown(f"**Archivo maestro:** {master_file}")
 
     # Mostrar datos a mergear
@@ -690,20 +809,21 @@ def show_merge_page():
         source = "datos filtrados (sin duplicados)"
     else:
         # Leer del archivo de output
-        df = pd.read_excel(st.session_state.output_file)
-        data_to_merge = df.to_dict('records')
+        output_file = st.session_state.output_file
+        data_to_merge = _load_output_records(output_file, os.path.getmtime(output_file))
         source = "archivo de búsqueda completo"
 
     st.markdown(f"**Datos a mergear:** {len(data_to_merge)} registros ({source})")
 
     # Vista previa
     with st.expander("👀 Vista Previa de Datos a Mergear"):
-        df_preview = pd.DataFrame(data_to_merge)
-        st.dataframe(df_preview.head(10), use_container_width=True)
+        # Solo las primeras 10 filas: no hace falta convertir todo a DataFrame
+        df_preview = pd.DataFrame(data_to_merge[:10])
+        st.dataframe(df_preview, use_container_width=True)
 
     if st.button("🔄 Ejecutar Merge Final", use_container_width=True):
         with st.spinner("Ejecutando merge..."):
-            result = run_merge(st.session_state.output_file or "temp.xlsx")
+            result = run_merge(data_to_merge)
 
         if "error" in result:
             st.error(f"❌ Error en merge: {result['error']}")
@@ -725,14 +845,13 @@ def show_merge_page():
 
         # Botón para descargar
         if os.path.exists(result['merged_file']):
-            with open(result['merged_file'], 'rb') as f:
-                st.download_button(
-                    label="📥 Descargar Archivo Merged",
-                    data=f,
-                    file_name=os.path.basename(result['merged_file']),
-                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    use_container_width=True
-                )
+            st.download_button(
+                label="📥 Descargar Archivo Merged",
+                data=Path(result['merged_file']).read_bytes,  # Se lee solo al pulsar
+                file_name=os.path.basename(result['merged_file']),
+                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                use_container_width=True
+            )
 
         # Opción para usar el archivo merged como nuevo input
         st.markdown("---")
@@ -743,11 +862,8 @@ def show_merge_page():
         with col1:
             if st.button("✅ Usar Merged como Nuevo Input", use_container_width=True, type="primary"):
                 with st.spinner("Moviendo archivo merged a input..."):
-                    # Importar la función
-                    sys.path.insert(0, os.path.dirname(__file__))
-                    from post_merge_manager import move_merged_to_input
-
                     move_result = move_merged_to_input(result['merged_file'], backup_old_input=True)
+                    _invalidate_file_listings()
 
                     if "error" in move_result:
                         st.error(f"❌ Error al mover archivo: {move_result['error']}")
@@ -765,9 +881,8 @@ def show_merge_page():
         with col2:
             if st.button("🧹 Limpiar Archivos Antiguos", use_container_width=True):
                 with st.spinner("Limpiando archivos antiguos..."):
-                    from post_merge_manager import cleanup_old_files
-
                     cleanup_result = cleanup_old_files(days_old=30)
+                    _invalidate_file_listings()
 
                     if "error" in cleanup_result:
                         st.error(f"❌ Error en limpieza: {cleanup_result['error']}")
@@ -777,7 +892,7 @@ def show_merge_page():
                         else:
                             st.info("✨ No hay archivos antiguos para limpiar")
 
-def show_files_page():
+def show_files_page(env):
     st.markdown('<h1 class="main-header">📁 Gestión de Archivos</h1>', unsafe_allow_html=True)
 
     st.markdown("Administra y descarga tus archivos de datos de marketing.")
@@ -792,16 +907,43 @@ def show_files_page():
             tab.warning(f"Directorio data/{directory}/ no existe")
             return
 
-        files = list(path.glob("*.xlsx")) + list(path.glob("*.xls"))
+        files = [Path(f) for f in _list_excels(directory)]
         if not files:
             tab.info(f"No hay archivos Excel en data/{directory}/")
             return
 
-        for file in sorted(files, key=lambda x: x.stat().st_mtime, reverse=True):
-            with tab.expander(f"📄 {file.name}"):
+        # Un solo stat() por archivo: se reutiliza para ordenar y para mostrar
+        entries = []
+        for file in files:
+            try:
+                entries.append((file, file.stat()))
+            except FileNotFoundError:
+                continue  # Movido o borrado desde que se cacheó el listado
+        entries.sort(key=lambda entry: entry[1].st_mtime, reverse=True)
+
+        # Expanders con estado (on_change="rerun"): el detalle de un archivo
+        # solo se calcula mientras su expander está abierto
+        expanders = [
+            (file, stat, tab.expander(f"📄 {file.name}", key=f"files_{directory}_{file.name}",
+                                      on_change="rerun"))
+            for file, stat in entries
+        ]
+        opened = [(file, stat, expander) for file, stat, expander in expanders if expander.open]
+        if not opened:
+            return
+
+        # Contar registros de los archivos abiertos en paralelo (la lectura del
+        # zip/XML libera el GIL); cada conteo sigue cacheado por versión
+        with ThreadPoolExecutor(max_workers=min(8, len(opened))) as executor:
+            row_counts = {
+                file: executor.submit(_excel_row_count, str(file), stat.st_mtime, stat.st_size)
+                for file, stat, _ in opened
+            }
+
+        for file, stat, expander in opened:
+            with expander:
                 # Información del archivo
-                stat = file.stat()
-                modified_time = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+                modified_time = _fmt_mtime(stat.st_mtime)
                 size_mb = stat.st_size / (1024 * 1024)
 
                 col1, col2, col3 = st.columns(3)
@@ -810,21 +952,18 @@ def show_files_page():
                 with col2:
                     st.metric("Modificado", modified_time)
                 with col3:
-                    # Leer primeras filas para preview
                     try:
-                        df = pd.read_excel(file)
-                        st.metric("Registros", len(df))
+                        st.metric("Registros", row_counts[file].result())
                     except:
                         st.metric("Registros", "N/A")
 
-                # Botón de descarga
-                with open(file, 'rb') as f:
-                    tab.download_button(
-                        label="📥 Descargar",
-                        data=f,
-                        file_name=file.name,
-                        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                    )
+                # Botón de descarga: el archivo se lee al pulsar, no en cada render
+                st.download_button(
+                    label="📥 Descargar",
+                    data=file.read_bytes,
+                    file_name=file.name,
+                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                )
 
     with tab1:
         show_files_in_directory("input", tab1)
@@ -837,7 +976,6 @@ def show_files_page():
 
     with tab4:
         st.markdown("### 📊 Resumen General")
-        env = check_environment()
         col1, col2, col3 = st.columns(3)
 
         with col1:
@@ -845,8 +983,17 @@ def show_files_page():
         with col2:
             st.metric("Total Output", env['output_files'])
         with col3:
-            merged_count = len(list(Path('data/merged').glob('*.xlsx')) + list(Path('data/merged').glob('*.xls')))
+            merged_count = len(_list_excels('merged'))
             st.metric("Total Merged", merged_count)
 
+# Páginas de la navegación: etiqueta -> handler (recibe el estado del entorno)
+_PAGES = {
+    "🏠 Inicio": show_home_page,
+    "🔍 Buscar Empresas": lambda env: show_search_page(),
+    "🔄 Verificar Duplicados": lambda env: show_duplicates_page(),
+    "📊 Merge Final": lambda env: show_merge_page(),
+    "📁 Archivos": show_files_page,
+}
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -14,9 +14,6 @@ st.set_page_config(
     layout="wide"
 )
 
-st.title("🎯 Marketing Script - Versión Demo")
-st.markdown("---")
-
 # Datos de ejemplo
 sample_data = [
     {
@@ -42,50 +39,57 @@ sample_data = [
     }
 ]
 
-st.header("📋 Datos de Ejemplo")
-st.markdown("Estos son datos de muestra para probar la funcionalidad de la aplicación:")
+@st.cache_data(show_spinner=False)
+def _sample_df() -> pd.DataFrame:
+    """DataFrame de ejemplo, construido una sola vez y no en cada rerun."""
+    return pd.DataFrame(sample_data)
+
+
+def main():
+    st.title("🎯 Marketing Script - Versión Demo")
+    st.markdown("---")
 
-df = pd.DataFrame(sample_data)
-st.dataframe(df, use_container_width=True)
+    st.header("📋 Datos de Ejemplo")
+    st.markdown("Estos son datos de muestra para probar la funcionalidad de la aplicación:")
 
-st.markdown("---")
+    df = _sample_df()
+    st.dataframe(df, use_container_width=True)
 
-# Simulación de búsqueda
-st.header("🔍 Simulación de Búsqueda")
+    st.markdown("---")
 
-col1, col2, col3 = st.columns(3)
+    # Simulación de búsqueda
+    st.header("🔍 Simulación de Búsqueda")
 
-with col1:
-    city = st.selectbox("Ciudad", ["Montería", "Medellín", "Bogotá", "Cali"])
+    col1, col2, col3 = st.columns(3)
 
-with col2:
-    business_type = st.selectbox("Tipo de Negocio", ["restaurante", "hotel", "café", "tienda"])
+    with col1:
+        city = st.selectbox("Ciudad", ["Montería", "Medellín", "Bogotá", "Cali"])
 
-with col3:
-    target_count = st.slider("Cantidad objetivo", 5, 50, 10)
+    with col2:
+        business_type = st.selectbox("Tipo de Negocio", ["restaurante", "hotel", "café", "tienda"])
 
-if st.button("🚀 Buscar Negocios", type="primary"):
-    with st.spinner("Buscando negocios..."):
-        import time
-        time.sleep(2)  # Simular búsqueda
+    with col3:
+        target_count = st.slider("Cantidad objetivo", 5, 50, 10)
 
-        # Mostrar resultados simulados
-        st.success(f"✅ Encontrados {len(sample_data)} negocios en {city}")
+    if st.button("🚀 Buscar Negocios", type="primary"):
+        # Mostrar resultados simulados (sin espera artificial: no bloquear el worker)
+        results = sample_data[:target_count]
+        st.success(f"✅ Encontrados {len(results)} negocios ({business_type}) en {city}")
 
         # Mostrar resultados
-        for i, business in enumerate(sample_data, 1):
+        for i, business in enumerate(results, 1):
             with st.expander(f"{i}. {business['name']}"):
                 st.write(f"📍 **Dirección:** {business['address']}")
                 st.write(f"📞 **Teléfono:** {business['phone']}")
                 st.write(f"📧 **Email:** {business['email']}")
                 st.write(f"🌐 **Website:** {business['website']}")
 
-st.markdown("---")
+    st.markdown("---")
 
-# Información del sistema
-st.header("ℹ️ Información del Sistema")
+    # Información del sistema
+    st.header("ℹ️ Información del Sistema")
 
-st.info("""
+    st.info("""
 **Estado:** ✅ Aplicación funcionando correctamente
 
 **Problema identificado:** La API key de Google Places necesita ser configurada correctamente.
@@ -93,17 +97,17 @@ st.info("""
 **Solución:** Obtén una API key válida desde [Google Cloud Console](https://console.cloud.google.com/apis/credentials)
 """)
 
-# Mostrar configuración actual
-st.subheader("🔧 Configuración Actual")
-st.code(f"""
+    # Mostrar configuración actual
+    st.subheader("🔧 Configuración Actual")
+    st.code(f"""
 GOOGLE_API_KEY={'*' * 20} (necesita configuración)
 AUTH_USERS=admin,testuser
 AUTH_PASSWORDS=admin123,test123
 """)
 
-st.markdown("---")
+    st.markdown("---")
 
-st.markdown("""
+    st.markdown("""
 ### 📝 Próximos Pasos:
 
 1. **Obtener API Key de Google Places:**
@@ -127,4 +131,8 @@ st.markdown("""
 ### 🆘 ¿Necesitas ayuda?
 
 Si tienes problemas para obtener la API key, puedes usar esta versión demo para familiarizarte con la interfaz.
-""")
\ No newline at end of file
+""")
+
+
+if __name__ == "__main__":
+    main()
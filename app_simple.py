@@ -18,6 +18,7 @@ st.set_page_config(
 )
 
 # ===== CONFIGURACIÓN DE AUTENTICACIÓN =====
+@st.cache_data
 def get_auth_config():
     """Obtiene la configuración de autenticación desde variables de entorno o valores por defecto."""
 
@@ -26,41 +27,39 @@ def get_auth_config():
     auth_passwords = os.getenv('AUTH_PASSWORDS', 'admin123')  # Lista separada por comas
     auth_names = os.getenv('AUTH_NAMES', 'Administrador')  # Lista separada por comas
 
-    # Convertir a listas
-    usernames = [u.strip() for u in auth_users.split(',')]
-    passwords = [p.strip() for p in auth_passwords.split(',')]
-    names = [n.strip() for n in auth_names.split(',')]
-
-    # Asegurar que todas las listas tengan la misma longitud
-    min_length = min(len(usernames), len(passwords), len(names))
-    usernames = usernames[:min_length]
-    passwords = passwords[:min_length]
-    names = names[:min_length]
+    # zip recorta a la lista más corta, igual que antes con min_length
+    triples = zip(auth_users.split(','), auth_passwords.split(','), auth_names.split(','))
 
     # Crear diccionario de credenciales
     credentials = {
-        "usernames": {}
-    }
-
-    for i, username in enumerate(usernames):
-        credentials["usernames"][username] = {
-            "name": names[i] if i < len(names) else username,
-            "password": passwords[i] if i < len(passwords) else "password"
+        "usernames": {
+            u.strip(): {"name": n.strip(), "password": p.strip()}
+            for u, p, n in triples
         }
+    }
 
-    return credentials
-
-# Inicializar autenticador
-auth_config = get_auth_config()
-authenticator = stauth.Authenticate(
-    auth_config,
-    "marketing_script_db",
-    "auth_key_unique_12345",
-    cookie_expiry_days=1
-)
+    # Hashear con bcrypt una sola vez por proceso. st.cache_data devuelve una
+    # copia en cada llamada: Authenticate modifica el diccionario (estado de
+    # login, intentos fallidos) y no debe compartirse entre sesiones
+    return stauth.Hasher.hash_passwords(credentials)
+
+def _build_authenticator():
+    """Crea el autenticador de la sesión actual.
+
+    No se cachea con st.cache_resource: el CookieManager interno lee las
+    cookies del navegador de cada sesión al construirse y no debe compartirse.
+    """
+    return stauth.Authenticate(
+        get_auth_config(),
+        "marketing_script_db",
+        "auth_key_unique_12345",
+        cookie_expiry_days=1,
+        auto_hash=False
+    )
 
 def main():
     # ===== AUTENTICACIÓN =====
+    authenticator = _build_authenticator()
     try:
         authenticator.login('main')
     except Exception as e:
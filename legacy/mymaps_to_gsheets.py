@@ -6,7 +6,7 @@
 # Google Sheets (o en CSV/XLSX si lo pides).
 #
 # REQUISITOS
-# pip install: requests beautifulsoup4 python-dotenv pandas openpyxl tenacity tldextract
+# pip install: requests python-dotenv pandas openpyxl tldextract
 #
 # AUTENTICACIÓN
 # 1) Google Places API:
@@ -24,20 +24,30 @@
 #   python mymaps_to_gsheets.py --city "Bogotá" --type "spa" --outfile "spas_bogota.csv"
 #
 import argparse
+import html
+import importlib.util
 import os
 import time
 import re
+import sys
+import threading
+from datetime import timedelta
+from functools import lru_cache
+from itertools import islice
 from urllib.parse import urljoin, urlparse
 
 import requests
-from bs4 import BeautifulSoup
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import pandas as pd
 import tldextract
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import random
 
+# Raíz del proyecto en el path: el XLSX se escribe con el mismo helper que src/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.output_writer import write_frame_xlsx
+
 # NOTE: Google Sheets support removed/disabled in this branch to simplify
 # the local workflow. The original script used gspread; to avoid accidental
 # writes and extra dependencies, gspread-related code is disabled.
@@ -49,18 +59,124 @@ EMAIL_REGEX = re.compile(
     re.IGNORECASE,
 )
 
+# Para escanear páginas completas se usa google-re2 (DFA, tiempo lineal, sin
+# backtracking) si está instalado; si no, re. El patrón es de bytes para
+# escanear r.content sin decodificar todo el HTML (solo se decodifican los matches)
+if importlib.util.find_spec("re2"):
+    import re2 as _scan_re
+else:
+    _scan_re = re
+EMAIL_REGEX_B = _scan_re.compile(rb"[A-Za-z0-9_.+%-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+# Destino de los href="mailto:..." (sin construir un árbol HTML solo para esto)
+MAILTO_REGEX_B = _scan_re.compile(rb"""[Hh][Rr][Ee][Ff]\s*=\s*["']?\s*mailto:\s*([^"'?>\s]+)""")
+
+BAD_EMAIL_DOMAINS = {"example.com", "localhost"}
+
+# Páginas de un mismo sitio que se piden a la vez (cortesía con el servidor)
+PAGES_PER_HOST = 2
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                   "AppleWebKit/537.36 (KHTML, like Gecko) "
                   "Chrome/120.0.0.0 Safari/537.36"
 }
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8),
-       retry=retry_if_exception_type(requests.RequestException))
+# Caché HTTP en disco (requests-cache, opcional): repetir una corrida no
+# vuelve a pedir los mismos details ni las mismas páginas. Se desactiva con --no-cache.
+# Vive en .cache/ (ignorado por git), no suelto en el directorio de trabajo
+HTTP_CACHE_PATH = os.path.join(".cache", "mymaps_cache.sqlite")
+HTTP_CACHE_EXPIRE = timedelta(hours=24)
+
+# Sesión compartida: reutiliza conexiones (keep-alive) en lugar de abrir un
+# TCP+TLS nuevo por request. El pool se dimensiona en main() según --workers
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+
+def _cacheable(resp) -> bool:
+    # Places responde errores (OVER_QUERY_LIMIT, REQUEST_DENIED...) con HTTP 200
+    # y el status en el JSON: esos no se cachean
+    if "maps.googleapis.com" not in resp.url:
+        return True
+    try:
+        return resp.json().get("status") in ("OK", "ZERO_RESULTS")
+    except ValueError:
+        return False
+
+def configure_session(workers: int, use_cache: bool = True) -> None:
+    global SESSION
+    if use_cache and importlib.util.find_spec("requests_cache"):
+        from requests_cache import CachedSession
+        os.makedirs(os.path.dirname(HTTP_CACHE_PATH), exist_ok=True)
+        SESSION = CachedSession(
+            HTTP_CACHE_PATH,
+            expire_after=HTTP_CACHE_EXPIRE,
+            allowable_methods=("GET",),
+            ignored_parameters=["key"],  # la API key no entra en la clave ni se guarda
+            filter_fn=_cacheable,
+            stale_if_error=True,
+        )
+        SESSION.headers.update(HEADERS)
+    n = max(workers, 4)
+    adapter = HTTPAdapter(pool_connections=n * 2, pool_maxsize=n * PAGES_PER_HOST)
+    SESSION.mount("https://", adapter)
+    SESSION.mount("http://", adapter)
+
+MAX_ATTEMPTS = 3
+
+def _retry_delay(resp, attempt: int) -> float:
+    # Respeta Retry-After (en segundos, máx. 60) si el servidor lo manda;
+    # si no, backoff exponencial (1, 2, 4... máx. 8 s) con jitter
+    retry_after = resp.headers.get("Retry-After", "") if resp is not None else ""
+    if retry_after.isdigit():
+        return min(int(retry_after), 60)
+    return min(2 ** attempt, 8) * (0.5 + random.random())
+
 def _get(url, **kwargs):
-    resp = requests.get(url, timeout=kwargs.pop("timeout", 12), headers=HEADERS, **kwargs)
-    resp.raise_for_status()
-    return resp
+    timeout = kwargs.pop("timeout", 12)
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            resp = SESSION.get(url, timeout=timeout, **kwargs)
+            resp.raise_for_status()
+            return resp
+        except requests.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            # Un 4xx (salvo 429) no cambia al reintentar: p.ej. 404 en rutas candidatas
+            if attempt == MAX_ATTEMPTS - 1 or (status is not None and 400 <= status < 500 and status != 429):
+                raise
+            time.sleep(_retry_delay(e.response, attempt))
+
+class RateLimiter:
+    # Espacia las llamadas para no pasar de `qps` por segundo entre todos los
+    # hilos: cada llamada reserva su turno bajo el lock y duerme fuera de él
+    def __init__(self, qps: float):
+        self._lock = threading.Lock()
+        self._next = 0.0
+        self.set_qps(qps)
+
+    def set_qps(self, qps: float) -> None:
+        self.interval = 1.0 / qps if qps > 0 else 0.0
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Límite por defecto de Google Places: 10 QPS por método (ajustable con --qps)
+PLACES_LIMITER = RateLimiter(10)
+
+def _places_get(url: str, params: dict) -> dict:
+    # Places avisa la cuota agotada con HTTP 200 y status OVER_QUERY_LIMIT en el JSON
+    for attempt in range(MAX_ATTEMPTS):
+        PLACES_LIMITER.wait()
+        data = _get(url, params=params).json()
+        if data.get("status") != "OVER_QUERY_LIMIT" or attempt == MAX_ATTEMPTS - 1:
+            return data
+        time.sleep(_retry_delay(None, attempt))
 
 def normalize_url(url: str) -> str:
     if not url:
@@ -71,92 +187,128 @@ def normalize_url(url: str) -> str:
     url = url.split("#")[0]
     return url
 
+# Usa la Public Suffix List incluida en tldextract, sin descargarla al arrancar
+_TLD_EXTRACT = tldextract.TLDExtract(suffix_list_urls=(), fallback_to_snapshot=True)
+
+@lru_cache(maxsize=4096)
+def registrable_domain(host: str) -> tuple[str, str]:
+    # (dominio, sufijo) de un host, cacheado: el mismo host se repite mucho
+    e = _TLD_EXTRACT(host.lower())
+    return (e.domain, e.suffix)
+
 def same_registrable_domain(url_a: str, url_b: str) -> bool:
     try:
-        da = tldextract.extract(url_a)
-        db = tldextract.extract(url_b)
-        return (da.domain, da.suffix) == (db.domain, db.suffix) and da.domain != "" and da.suffix != ""
+        da = registrable_domain(urlparse(url_a).hostname or "")
+        db = registrable_domain(urlparse(url_b).hostname or "")
+        return da == db and da[0] != "" and da[1] != ""
     except Exception:
         return False
 
 def harvest_emails_from_html(html: str) -> set[str]:
-    emails = set(re.findall(EMAIL_REGEX, html or ""))
-    bad_suffixes = {"example.com", "localhost"}
-    return {e for e in emails if e.split("@")[-1].lower() not in bad_suffixes}
+    emails = set(EMAIL_REGEX.findall(html or ""))
+    return {e for e in emails if e.split("@")[-1].lower() not in BAD_EMAIL_DOMAINS}
+
+def harvest_emails_from_bytes(buf: bytes) -> set[str]:
+    # Igual que harvest_emails_from_html pero sobre el cuerpo crudo de la respuesta
+    emails = {m.decode("ascii") for m in EMAIL_REGEX_B.findall(buf or b"")}
+    return {e for e in emails if e.split("@")[-1].lower() not in BAD_EMAIL_DOMAINS}
+
+# Rutas candidatas (primero las de contacto, sin duplicados, máx. 20); se calculan una sola vez
+_CANDIDATE_PATHS = tuple(dict.fromkeys([
+    "/contact", "/contacto", "/contact-us", "/contactenos", "/contactar",
+    "/", "/contact", "/contacto", "/contact-us", "/contactenos", "/contactenos/",
+    "/contactar", "/contactar/", "/about", "/nosotros", "/quienes-somos", "/acerca",
+    "/ubicacion", "/location", "/reservas", "/reserva", "/bookings", "/booking",
+    "/politica-de-datos", "/politica-de-privacidad", "/privacy-policy"
+]))[:20]
 
 def candidate_paths():
-    paths = [
-        "/", "/contact", "/contacto", "/contact-us", "/contactenos", "/contactenos/",
-        "/contactar", "/contactar/", "/about", "/nosotros", "/quienes-somos", "/acerca",
-        "/ubicacion", "/location", "/reservas", "/reserva", "/bookings", "/booking",
-        "/politica-de-datos", "/politica-de-privacidad", "/privacy-policy"
-    ]
-    preferred = ["/contact", "/contacto", "/contact-us", "/contactenos", "/contactar"]
-    seen = set()
-    ordered = []
-    for p in preferred + paths:
-        if p not in seen:
-            ordered.append(p)
-            seen.add(p)
-        if len(ordered) >= 20:
-            break
-    return ordered
+    return _CANDIDATE_PATHS
+
+def _fetch_page(url: str):
+    try:
+        return _get(url)
+    except requests.RequestException:
+        return None
 
 def find_emails_on_site(base_url: str, max_pages: int = 5) -> list[str]:
     base_url = normalize_url(base_url)
     emails = set()
 
+    # Correos del mismo dominio registrable que el sitio (evita ruido de
+    # embeds). El dominio del sitio se resuelve una sola vez; para cada correo
+    # basta comparar el final del host, sin pasar por tldextract
+    domain, suffix = registrable_domain(urlparse(base_url).hostname or "")
+    base_domain = f"{domain}.{suffix}" if domain and suffix else ""
+
+    def same_domain(found: set[str]) -> set[str]:
+        if not base_domain:
+            return set()
+        dotted = "." + base_domain
+        return {e for e in found
+                if (host := e.rsplit("@", 1)[-1].lower()) == base_domain or host.endswith(dotted)}
+
+    # Las rutas (las de contacto primero) se piden en tandas de PAGES_PER_HOST
+    # concurrentes, sin sleep fijo, hasta max_pages páginas respondidas. En
+    # cuanto aparece un correo del dominio del sitio se deja de buscar
+    paths = iter(_CANDIDATE_PATHS)
     tried = 0
-    for path in candidate_paths():
-        if tried >= max_pages:
-            break
-        url = urljoin(base_url, path)
+    home_url = urljoin(base_url, "/")
+    home = None  # contenido de "/" si se descargó en las tandas
+    with ThreadPoolExecutor(max_workers=PAGES_PER_HOST) as ex:
+        while tried < max_pages and not same_domain(emails):
+            batch = [urljoin(base_url, p) for p in islice(paths, min(PAGES_PER_HOST, max_pages - tried))]
+            if not batch:
+                break
+            for url, r in zip(batch, ex.map(_fetch_page, batch)):
+                if r is not None:
+                    emails |= harvest_emails_from_bytes(r.content)
+                    tried += 1
+                    if url == home_url:
+                        home = r.content
+
+    # Explorar mailto: del home como refuerzo (solo si aún no hay correo del dominio)
+    filtered = same_domain(emails)
+    if not filtered:
+        # Si base_url es la raíz del sitio y "/" ya se descargó, se reutiliza
+        content = home if base_url.rstrip("/") == home_url.rstrip("/") else None
         try:
-            r = _get(url)
-            emails |= harvest_emails_from_html(r.text)
-            tried += 1
+            if content is None:
+                content = _get(base_url).content
+            for m in MAILTO_REGEX_B.findall(content):
+                # unescape: igual que el parser HTML, resuelve entidades como &#64;
+                email = html.unescape(m.decode("utf-8", "ignore")).strip()
+                if email and EMAIL_REGEX.match(email):
+                    emails.add(email)
         except requests.RequestException:
-            continue
-        time.sleep(0.75)
-
-    # Explorar mailto: del home como refuerzo
-    try:
-        r = _get(base_url)
-        soup = BeautifulSoup(r.text, "html.parser")
-        for a in soup.select('a[href^="mailto:"]'):
-            href = a.get("href", "")
-            email = href.replace("mailto:", "").split("?")[0].strip()
-            if email and re.match(EMAIL_REGEX, email):
-                emails.add(email)
-    except requests.RequestException:
-        pass
+            pass
+        filtered = same_domain(emails)
 
-    # Prefiere correos del mismo dominio registrable (evita ruido de embeds)
-    filtered = set()
-    for e in emails:
-        try:
-            host = e.split("@")[-1]
-            if same_registrable_domain(base_url, "https://" + host):
-                filtered.add(e)
-        except Exception:
-            continue
     if filtered:
         return sorted(filtered)
     return sorted(emails)
 
 
+# Palabra con los espacios que la siguen (los espacios iniciales van solos)
+_WORD_RE = re.compile(r"\S+\s*|\s+")
+
 def human_print(text: str, humanize: bool = False, speed: float = 0.02):
     """Print texto simulando tipeo humano. Si humanize=False hace print normal."""
     if not humanize:
         print(text)
         return
-    # Simular tipeo con posibles typos leves y corrección
-    out = []
-    for ch in text:
-        print(ch, end="", flush=True)
-        time.sleep(speed * (0.5 + random.random()))
+    # Escribir palabra a palabra: una escritura y un flush por palabra (no por
+    # carácter); la pausa es la suma de las pausas por carácter de la palabra
+    write, flush, rand = sys.stdout.write, sys.stdout.flush, random.random
+    for word in _WORD_RE.findall(text):
+        time.sleep(speed * sum(0.5 + rand() for _ in word))
+        write(word)
+        flush()
     print()
 
+# Pausas antes de cada intento con un next_page_token (suman ~4 s en el peor caso)
+PAGETOKEN_DELAYS = (0.3, 0.6, 1.2, 2.0)
+
 def places_text_search(api_key: str, query: str, limit: int = 120) -> list[dict]:
     url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
     out = []
@@ -165,9 +317,17 @@ def places_text_search(api_key: str, query: str, limit: int = 120) -> list[dict]
         params = {"query": query, "key": api_key}
         if pagetoken:
             params["pagetoken"] = pagetoken
-            time.sleep(2.0)  # Requisito de Google antes de usar next_page_token
-        r = _get(url, params=params)
-        data = r.json()
+            # El next_page_token tarda en activarse (hasta ~2 s); mientras tanto
+            # Places responde INVALID_REQUEST. Se reintenta con pausas crecientes
+            for delay in PAGETOKEN_DELAYS:
+                time.sleep(delay)
+                data = _places_get(url, params)
+                if data.get("status") != "INVALID_REQUEST":
+                    break
+            else:
+                break
+        else:
+            data = _places_get(url, params)
         out.extend(data.get("results", []))
         pagetoken = data.get("next_page_token")
         if not pagetoken:
@@ -187,12 +347,40 @@ def place_details(api_key: str, place_id: str) -> dict:
         "url"
     ]
     params = {"key": api_key, "place_id": place_id, "fields": ",".join(fields)}
-    r = _get(url, params=params)
-    return r.json().get("result", {})
+    return _places_get(url, params).get("result", {})
+
+# Hilos para pedir details de Places (el ritmo real lo limita PLACES_LIMITER)
+DETAILS_WORKERS = 8
+
+def fetch_all_details(api_key: str, place_ids: list[str], humanize: bool = False) -> dict:
+    # Details de todos los lugares en paralelo, como etapa previa al escaneo de
+    # sitios: la latencia de la API no queda detrás del scraping de HTML.
+    # Si falla un place_id se omite (el item usa los datos de la búsqueda)
+    details = {}
+    place_ids = list(dict.fromkeys(place_ids))
+    if not place_ids:
+        return details
+    with ThreadPoolExecutor(max_workers=min(DETAILS_WORKERS, len(place_ids))) as ex:
+        futures = {ex.submit(place_details, api_key, pid): pid for pid in place_ids}
+        for fut in as_completed(futures):
+            pid = futures[fut]
+            try:
+                details[pid] = fut.result()
+            except Exception as e:
+                human_print(f"[warn] falló details para {pid}: {e}", humanize=humanize)
+    return details
 
 def build_query(city: str, biz_type: str) -> str:
     return f"{biz_type} in {city}"
 
+def first_non_empty(df: pd.DataFrame, *cols: str) -> pd.Series:
+    # Por fila, el primer valor no vacío entre las columnas que existan ("" si ninguna)
+    out = pd.Series("", index=df.index, dtype=object)
+    for c in cols:
+        if c in df.columns:
+            out = out.where(out != "", df[c])
+    return out
+
 # write_to_gsheets removed: export to Google Sheets is disabled. Use --outfile
 # to save results locally in CSV/XLSX/TXT formats.
 
@@ -212,7 +400,11 @@ def main():
     parser.add_argument("--workers", type=int, default=1, help="Número de hilos para escanear sitios (default 1 = secuencial)")
     parser.add_argument("--humanize", action="store_true", help="Si se setea, imprime progreso con efecto de tipeo humano")
     parser.add_argument("--humanize-speed", type=float, default=0.02, help="Velocidad base del tipeo humano en segundos por carácter (default 0.02)")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché HTTP en disco (requests-cache) aunque esté instalada")
+    parser.add_argument("--qps", type=float, default=10, help="Máx. llamadas por segundo a Google Places (default 10; 0 = sin límite)")
     args = parser.parse_args()
+    PLACES_LIMITER.set_qps(args.qps)
+    configure_session(args.workers, use_cache=not args.no_cache)
 
     api_key = os.getenv("GOOGLE_API_KEY")
 
@@ -222,22 +414,20 @@ def main():
         if not os.path.exists(args.input_csv):
             raise SystemExit(f"ERROR: No existe el archivo CSV de entrada: {args.input_csv}")
         use_places = False
-        # Cargar CSV y transformar en 'results'
-        results = []
+        # Cargar CSV y transformar en 'results' por columnas (sin iterrows)
         df_in = pd.read_csv(args.input_csv, dtype=str).fillna("")
-        for _, row in df_in.iterrows():
-            website = row.get('Página Web') or row.get('website') or row.get('Web') or ""
-            results.append({
-                'place_id': None,
-                'name': row.get('Nombre') or row.get('name') or "",
-                'website': website,
-                'formatted_address': "",
-                'url': website,
-                # conservar teléfono y correo en el dict para usarlos si existen
-                'phone_raw': row.get('Teléfono') or row.get('phone') or "",
-                'email_raw': row.get('Correo') or row.get('Email') or row.get('email') or "",
-                'city_raw': row.get('Ciudad') or row.get('city') or ""
-            })
+        website = first_non_empty(df_in, 'Página Web', 'website', 'Web')
+        results = pd.DataFrame({
+            'place_id': None,
+            'name': first_non_empty(df_in, 'Nombre', 'name'),
+            'website': website,
+            'formatted_address': "",
+            'url': website,
+            # conservar teléfono y correo en el dict para usarlos si existen
+            'phone_raw': first_non_empty(df_in, 'Teléfono', 'phone'),
+            'email_raw': first_non_empty(df_in, 'Correo', 'Email', 'email'),
+            'city_raw': first_non_empty(df_in, 'Ciudad', 'city'),
+        }, index=df_in.index).to_dict("records")
     elif args.input_file:
         if not os.path.exists(args.input_file):
             raise SystemExit(f"ERROR: No existe el archivo de entrada: {args.input_file}")
@@ -297,22 +487,22 @@ def main():
     for r in results:
         place_id = r.get("place_id")
         if place_id:
-            # We will fetch details later in worker if needed
+            # El website sale de los details (etapa 1)
             website = None
         else:
             website = r.get("website") or r.get("url")
         tasks.append((r, website))
 
+    # Etapa 1: details de Places en paralelo; etapa 2 (abajo): escaneo de sitios
+    place_ids = [r["place_id"] for r in results if r.get("place_id")]
+    if place_ids:
+        human_print(f"[i] Obteniendo details de {len(set(place_ids))} lugares...", humanize=args.humanize, speed=args.humanize_speed)
+    details = fetch_all_details(api_key, place_ids, humanize=args.humanize)
+
     def process_item(r, website, humanize=False):
-        # Obtener detalles si tenemos place_id
+        # Detalles ya obtenidos en la etapa 1 (si falló, se usan los datos de la búsqueda)
         place_id = r.get("place_id")
-        d = r
-        if place_id:
-            try:
-                d = place_details(api_key, place_id)
-            except requests.RequestException as e:
-                human_print(f"[warn] falló details para {place_id}: {e}", humanize=humanize)
-                d = r
+        d = details.get(place_id, r) if place_id else r
         name = (d.get("name") or r.get("name") or "")
         phone = d.get("formatted_phone_number") or d.get("international_phone_number") or r.get('phone_raw') or r.get('Teléfono') or ""
         website_local = d.get("website") or r.get("website") or website or ""
@@ -383,18 +573,16 @@ def main():
         if out.lower().endswith(".csv"):
             df.to_csv(out, index=False, encoding="utf-8-sig")
         else:
-            df.to_excel(out, index=False, engine="openpyxl")
+            write_frame_xlsx(df, out)
         print(f"[✓] Archivo guardado -> {out}")
 
     if args.out_txt:
-        # Guardar una versión simple en texto
+        # Guardar una versión simple en texto, una línea compacta por fila:
+        # Nombre | Teléfono | Correo | Web | Ciudad | Dirección (por columnas, una sola escritura)
+        txt = df[["Nombre", "Teléfono", "Correo", "Página Web", "Ciudad", "Dirección (opcional)"]].map(str)
+        lines = txt.iloc[:, 0].str.cat([txt[c] for c in txt.columns[1:]], sep=" | ")
         with open(args.out_txt, "w", encoding="utf-8") as fh:
-            for _, row in df.iterrows():
-                # línea compacta: Nombre | Teléfono | Correo | Web | Ciudad | Dirección
-                line = " | ".join([str(row.get(c, "")) for c in [
-                    "Nombre", "Teléfono", "Correo", "Página Web", "Ciudad", "Dirección (opcional)"
-                ]])
-                fh.write(line + "\n")
+            fh.write("\n".join(lines) + "\n")
         print(f"[✓] Archivo de texto guardado -> {args.out_txt}")
 
     if not args.outfile:
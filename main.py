@@ -17,16 +17,8 @@ import os
 import sys
 from dotenv import load_dotenv
 
-# Añadir src al path para imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
-
-from src.business_processor import BusinessDataProcessor
-from src.output_writer import OutputWriter
-
 
 def main():
-    load_dotenv()
-    
     parser = argparse.ArgumentParser(
         description="Recolector de datos de negocios con múltiples fuentes y formatos de salida",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -94,10 +86,17 @@ Variables de entorno:
         parser.error(f"Archivo de entrada no existe: {args.input_file}")
     
     # Configurar API key
+    load_dotenv()
     api_key = os.getenv("GOOGLE_API_KEY")
     if args.city and not api_key:
         parser.error("GOOGLE_API_KEY requerida en .env para usar Places API")
     
+    # Imports pesados (pandas, requests...) solo tras validar los argumentos:
+    # --help y los errores de uso responden sin cargarlos
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+    from src.business_processor import BusinessDataProcessor
+    from src.output_writer import OutputWriter
+    
     # Inicializar procesador
     try:
         processor = BusinessDataProcessor(
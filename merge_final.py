@@ -5,40 +5,13 @@ con el Excel maestro en data/input/.
 """
 import os
 import sys
-from pathlib import Path
 from datetime import datetime
 
 # Añadir src al path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.output_writer import OutputWriter
-
-
-def find_latest_output():
-    """Encuentra el archivo más reciente en data/output/."""
-    output_dir = Path("data/output")
-    if not output_dir.exists():
-        return None
-    
-    excel_files = list(output_dir.glob("*.xlsx")) + list(output_dir.glob("*.xls"))
-    if not excel_files:
-        return None
-    
-    # Ordenar por fecha de modificación, más reciente primero
-    excel_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-    return str(excel_files[0])
-
-
-def find_input_excel():
-    """Encuentra el archivo Excel en data/input/."""
-    input_dir = Path("data/input")
-    if not input_dir.exists():
-        return None
-    
-    excel_files = list(input_dir.glob("*.xlsx")) + list(input_dir.glob("*.xls"))
-    if excel_files:
-        return str(excel_files[0])
-    return None
+from src.output_writer import OutputWriter, merge_columns, read_xlsx_frame
+from src.utils import find_input_excel, find_latest_output
 
 
 def main():
@@ -84,10 +57,13 @@ def main():
         # Inicializar output writer
         writer = OutputWriter(humanize=False)
         
-        # Leer datos del archivo de salida
-        import pandas as pd
-        df_new = pd.read_excel(output_file)
-        new_data = df_new.to_dict('records')
+        key_priority = ['Pagina Web', 'Nombre']
+
+        # Leer del archivo de salida solo las columnas que usa el merge
+        # (las del Excel maestro más claves y teléfonos); el DataFrame se
+        # pasa tal cual al merge, sin convertir a dicts. Los 'N/A' llegan como
+        # vacíos, igual que con pd.read_excel
+        new_data = read_xlsx_frame(output_file, columns=merge_columns(input_file, key_priority))
         
         print(f"✅ Leídos {len(new_data)} registros del archivo de salida")
         
@@ -95,7 +71,7 @@ def main():
         merged_path, renamed_original = writer.merge_into_existing_excel(
             existing_filepath=input_file,
             data=new_data,
-            key_priority=['Pagina Web', 'Nombre'],
+            key_priority=key_priority,
             output_dir=None  # Usa default: data/merged/
         )
         
@@ -7,7 +7,26 @@ import os
 import shutil
 from pathlib import Path
 from datetime import datetime
-import pandas as pd
+
+from src.output_writer import excel_row_count
+from src.utils import scan_excel_files
+
+# ioctl FICLONE de Linux: clon copy-on-write (reflink) en btrfs/XFS, O(1) sin copiar datos
+_FICLONE = 0x40049409
+
+def _fast_copy(src: str, dst: str) -> None:
+    """Copia src a dst intentando primero un reflink y si no, shutil.copy2.
+
+    En sistemas de archivos sin reflink (ext4, tmpfs, otros SO) el ioctl falla
+    y shutil.copy2 ya usa sendfile/copy_file_range internamente.
+    """
+    try:
+        import fcntl
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+    except (ImportError, OSError):
+        shutil.copy2(src, dst)
 
 def move_merged_to_input(merged_file_path: str, backup_old_input: bool = True) -> dict:
     """
@@ -32,8 +51,8 @@ def move_merged_to_input(merged_file_path: str, backup_old_input: bool = True) -
         if not input_dir.exists():
             input_dir.mkdir(parents=True, exist_ok=True)
 
-        # Encontrar archivos existentes en input
-        existing_files = list(input_dir.glob("*.xlsx")) + list(input_dir.glob("*.xls"))
+        # Encontrar archivos existentes en input (una sola pasada por el directorio)
+        existing_files = [Path(entry.path) for entry in scan_excel_files(str(input_dir))]
         old_input_files = []
 
         if existing_files:
@@ -48,6 +67,7 @@ def move_merged_to_input(merged_file_path: str, backup_old_input: bool = True) -
 
                 for old_file in existing_files:
                     backup_path = backup_subdir / old_file.name
+                    # backup está dentro de input: mismo sistema de archivos, move es un rename
                     shutil.move(str(old_file), str(backup_path))
                     old_input_files.append(str(old_file))
 
@@ -64,14 +84,13 @@ def move_merged_to_input(merged_file_path: str, backup_old_input: bool = True) -
         new_input_path = input_dir / new_input_name
 
         # Copiar en lugar de mover para mantener el original en merged
-        shutil.copy2(str(merged_path), str(new_input_path))
+        _fast_copy(str(merged_path), str(new_input_path))
 
         # Verificar que el archivo se copió correctamente
         if new_input_path.exists():
-            # Leer y verificar que el archivo es válido
+            # Verificar que el archivo es un Excel válido contando sus filas (sin DataFrame)
             try:
-                df = pd.read_excel(new_input_path)
-                record_count = len(df)
+                record_count = excel_row_count(str(new_input_path))
                 print(f"[✓] Archivo copiado exitosamente: {new_input_path}")
                 print(f"[📊] Registros en nuevo input: {record_count}")
             except Exception as e:
@@ -115,26 +134,25 @@ def cleanup_old_files(days_old: int = 30) -> dict:
         cutoff_date = datetime.now() - timedelta(days=days_old)
         cleaned_files = []
 
-        # Limpiar output
-        output_dir = Path("data/output")
-        if output_dir.exists():
-            for file_path in output_dir.glob("*.xlsx"):
-                if file_path.stat().st_mtime < cutoff_date.timestamp():
-                    file_path.unlink()
-                    cleaned_files.append(str(file_path))
+        # Limpiar output (una pasada de scandir; cada DirEntry cachea su stat).
+        # Solo .xlsx: scan_excel_files también devuelve los .xls
+        cutoff = cutoff_date.timestamp()
+        output_files = [e for e in scan_excel_files("data/output") if e.name.lower().endswith('.xlsx')]
+        for entry in output_files:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                cleaned_files.append(entry.path)
 
         # Limpiar merged (mantener solo los más recientes)
-        merged_dir = Path("data/merged")
-        if merged_dir.exists():
-            merged_files = list(merged_dir.glob("*.xlsx"))
-            if len(merged_files) > 5:  # Mantener máximo 5 archivos merged
-                # Ordenar por fecha de modificación (más antiguos primero)
-                merged_files.sort(key=lambda x: x.stat().st_mtime)
-                files_to_delete = merged_files[:-5]  # Mantener los 5 más recientes
-
-                for file_path in files_to_delete:
-                    file_path.unlink()
-                    cleaned_files.append(str(file_path))
+        merged_files = [e for e in scan_excel_files("data/merged") if e.name.lower().endswith('.xlsx')]
+        if len(merged_files) > 5:  # Mantener máximo 5 archivos merged
+            # Ordenar por fecha de modificación (más antiguos primero)
+            merged_files.sort(key=lambda e: e.stat().st_mtime)
+            files_to_delete = merged_files[:-5]  # Mantener los 5 más recientes
+
+            for entry in files_to_delete:
+                os.unlink(entry.path)
+                cleaned_files.append(entry.path)
 
         return {
             "success": True,
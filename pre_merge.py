@@ -3,44 +3,35 @@
 Script de pre-merge: Verifica duplicados antes del merge final.
 Compara datos nuevos con Excel maestro y permite buscar más si hay muchos duplicados.
 """
+import argparse
+import importlib.util
 import os
 import sys
 from pathlib import Path
-from typing import List, Dict, Tuple
+from itertools import compress
+from typing import List, Dict, Tuple, Union
+import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
 import re
+import zlib
 
 # Añadir src al path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.business_processor import BusinessDataProcessor
+from src.output_writer import EXCEL_NA_STRINGS, EXCEL_READ_ENGINE, read_xlsx_records, write_frame_xlsx
+from src.utils import find_input_excel, find_latest_output
 
 
-def find_latest_output():
-    """Encuentra el archivo más reciente en data/output/."""
-    output_dir = Path("data/output")
-    if not output_dir.exists():
-        return None
-
-    excel_files = list(output_dir.glob("*.xlsx")) + list(output_dir.glob("*.xls"))
-    if not excel_files:
-        return None
-
-    # Ordenar por fecha de modificación, más reciente primero
-    excel_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-    return str(excel_files[0])
-
-
-def find_input_excel():
-    """Encuentra el archivo Excel en data/input/."""
-    input_dir = Path("data/input")
-    if not input_dir.exists():
-        return None
-
-    excel_files = list(input_dir.glob("*.xlsx")) + list(input_dir.glob("*.xls"))
-    if not excel_files:
-        return None
-    return str(excel_files[0])
+# Patrones de normalización de claves, compilados una sola vez y aplicados en
+# este orden: protocolo, www y todo lo que no sea alfanumérico. Los comparten
+# normalize_key y la ruta vectorizada (_normalize_unique)
+_KEY_PATTERNS = (
+    re.compile(r'^https?://'),
+    re.compile(r'^www\.'),
+    re.compile(r'[^a-z0-9]'),
+)
 
 
 def normalize_key(val: str) -> str:
@@ -48,71 +39,246 @@ def normalize_key(val: str) -> str:
     if val is None:
         return ""
     s = str(val).lower().strip()
-    # remove protocol and www
-    s = re.sub(r'^https?://', '', s)
-    s = re.sub(r'^www\.', '', s)
-    # remove non-alphanumeric
-    s = re.sub(r'[^a-z0-9]', '', s)
+    for pattern in _KEY_PATTERNS:
+        s = pattern.sub('', s)
     return s
 
 
-def compare_with_existing(new_data: List[Dict], existing_filepath: str) -> Tuple[List[Dict], List[Dict], Dict]:
-    """
-    Compara datos nuevos con Excel existente.
-    Retorna: (datos_nuevos, datos_duplicados, info_duplicados)
+# Columnas del Excel maestro usadas para detectar duplicados
+_KEY_COLUMNS = ('Nombre', 'Pagina Web')
+
+
+def _text_column(df: pd.DataFrame, *names: str) -> pd.Series:
+    """Combina las columnas `names` (en orden de preferencia) como texto limpio, '' si faltan."""
+    result = pd.Series('', index=df.index, dtype=object)
+    for name in names:
+        if name in df.columns:
+            values = df[name].fillna('').astype(str).str.strip()
+            result = result.where(result != '', values)
+    return result
+
+
+def _normalize_series(values: pd.Series) -> pd.Series:
+    """Versión vectorizada de normalize_key para una columna completa.
+
+    Normaliza solo los valores distintos (factorize) y los reparte con sus
+    códigos: muchas filas comparten nombre o dominio.
     """
-    if not os.path.exists(existing_filepath):
-        return new_data, [], {}
+    codes, uniques = pd.factorize(values.fillna('').astype(str))
+    normalized = _normalize_unique(pd.Series(uniques, dtype=object))
+    return pd.Series(normalized.to_numpy()[codes], index=values.index, dtype=object)
+
+
+def _normalize_unique(values: pd.Series) -> pd.Series:
+    """Cadena de normalización de _normalize_series sobre valores ya en texto."""
+    s = values.str.lower().str.strip()
+    for pattern in _KEY_PATTERNS:
+        s = s.str.replace(pattern, '', regex=True)
+    return s
+
 
-    # Leer Excel existente
-    df_exist = pd.read_excel(existing_filepath)
-    df_exist.columns = [str(c).strip() for c in df_exist.columns]
+# MinHash de 3-gramas de caracteres + LSH por bandas para el pase difuso de
+# nombres: solo se comparan pares que comparten alguna banda, no N x M
+_MINHASH_PERM = 64
+_LSH_BANDS = 16  # 16 bandas de 4 filas: a similitud 0.85 casi siempre son candidatos
+_MINHASH_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+_MINHASH_A = _rng.integers(1, _MINHASH_PRIME, _MINHASH_PERM, dtype=np.uint64)
+_MINHASH_B = _rng.integers(0, _MINHASH_PRIME, _MINHASH_PERM, dtype=np.uint64)
+del _rng
 
-    # Crear mapas de claves existentes
-    existing_by_name = {}
-    existing_by_website = {}
 
-    for idx, row in df_exist.iterrows():
-        name = str(row.get('Nombre', '')).strip()
-        website = str(row.get('Pagina Web', '')).strip()
+def _minhash(key: str) -> np.ndarray:
+    """Firma MinHash de los 3-gramas de una clave normalizada."""
+    grams = {key[i:i + 3] for i in range(len(key) - 2)}
+    hashes = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+    hashes %= _MINHASH_PRIME
+    return ((hashes[:, None] * _MINHASH_A + _MINHASH_B) % _MINHASH_PRIME).min(axis=0)
 
-        if name:
-            existing_by_name[normalize_key(name)] = idx
-        if website and website != 'N/A':
-            existing_by_website[normalize_key(website)] = idx
+
+def _fuzzy_matches(new_keys: pd.Series, existing_keys: pd.Series,
+                   threshold: float = 0.85) -> pd.Series:
+    """Para cada clave nueva, el valor de `existing_keys` (índice = clave normalizada)
+    cuya similitud Jaccard estimada de 3-gramas es >= threshold; '' si no hay.
+
+    Claves de menos de 3 caracteres no participan.
+    """
+    rows = _MINHASH_PERM // _LSH_BANDS
+    buckets = {}
+    signatures = {}
+    for key in existing_keys.index.unique():
+        if len(key) < 3:
+            continue
+        sig = signatures[key] = _minhash(key)
+        for band in range(_LSH_BANDS):
+            buckets.setdefault((band, sig[band * rows:(band + 1) * rows].tobytes()), []).append(key)
+
+    first_value = existing_keys[~existing_keys.index.duplicated()]
+    matches = []
+    for key in new_keys:
+        best, best_score = '', threshold
+        if len(key) >= 3:
+            sig = _minhash(key)
+            candidates = set()
+            for band in range(_LSH_BANDS):
+                candidates.update(buckets.get((band, sig[band * rows:(band + 1) * rows].tobytes()), ()))
+            for candidate in candidates:
+                score = float(np.mean(signatures[candidate] == sig))
+                if score >= best_score:
+                    best, best_score = first_value[candidate], score
+        matches.append(best)
+    return pd.Series(matches, index=new_keys.index, dtype=object)
+
+
+# Cache en disco de las claves normalizadas del maestro (Parquet, requiere pyarrow):
+# las ejecuciones siguientes no vuelven a leer el Excel mientras no cambie
+_MASTER_CACHE = importlib.util.find_spec("pyarrow") is not None
+_MASTER_CACHE_DIR = ".cache"
+
+
+def _excel_text(value):
+    """Valor de celda como lo deja pd.read_excel(dtype=str): None para vacíos/NA."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value)
+    return None if text in EXCEL_NA_STRINGS else text
+
+
+def _read_key_columns_xlsx(filepath: str) -> pd.DataFrame:
+    """Columnas clave de un .xlsx recorriendo la hoja con openpyxl read_only y
+    values_only: sin objetos de celda ni el resto de columnas."""
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        keep = {}
+        for i, h in enumerate(next(rows, ())):
+            name = str(h).strip() if h is not None else ''
+            if name in _KEY_COLUMNS:
+                keep.setdefault(name, i)
+        data = [[_excel_text(row[i]) if i < len(row) else None for i in keep.values()]
+                for row in rows]
+    finally:
+        wb.close()
+    return pd.DataFrame(data, columns=list(keep), dtype=object)
+
+
+def _read_master_keys(existing_filepath: str) -> pd.DataFrame:
+    """Lee del Excel maestro solo las columnas clave y las normaliza.
+
+    Devuelve Nombre (texto limpio), name_key y website_key ('' si la web es N/A).
+    """
+    if EXCEL_READ_ENGINE is None and existing_filepath.lower().endswith('.xlsx'):
+        # Sin calamine: recorrer la hoja en streaming es más barato que read_excel
+        df_exist = _read_key_columns_xlsx(existing_filepath)
+    else:
+        # Solo las columnas clave y como texto: las claves solo se comparan como cadenas
+        df_exist = pd.read_excel(existing_filepath, engine=EXCEL_READ_ENGINE, dtype=str,
+                                 usecols=lambda c: str(c).strip() in _KEY_COLUMNS)
+        df_exist.columns = [str(c).strip() for c in df_exist.columns]
+
+    names = _text_column(df_exist, 'Nombre')
+    websites = _text_column(df_exist, 'Pagina Web')
+    return pd.DataFrame({
+        'Nombre': names,
+        'name_key': _normalize_series(names),
+        'website_key': _normalize_series(websites.where(websites != 'N/A', '')),
+    })
+
+
+def _master_keys(existing_filepath: str) -> pd.DataFrame:
+    """_read_master_keys con cache Parquet junto al maestro, por mtime y tamaño."""
+    if not _MASTER_CACHE:
+        return _read_master_keys(existing_filepath)
+
+    master_path = Path(existing_filepath)
+    st = master_path.stat()
+    cache_dir = master_path.parent / _MASTER_CACHE_DIR
+    cache_path = cache_dir / f"{master_path.stem}_{st.st_mtime_ns}_{st.st_size}.parquet"
+    if cache_path.exists():
+        try:
+            return pd.read_parquet(cache_path)
+        except Exception:
+            pass  # cache corrupta: se regenera
+
+    master = _read_master_keys(existing_filepath)
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        # Quitar las caches de versiones anteriores de este maestro
+        for old in cache_dir.glob(f"{master_path.stem}_*.parquet"):
+            if old.name.rsplit('_', 2)[0] == master_path.stem:
+                old.unlink()
+        master.to_parquet(cache_path, index=False, compression='zstd')
+    except OSError:
+        pass  # sin permisos de escritura: se trabaja sin cache
+    return master
+
+
+def compare_with_existing(new_data: Union[List[Dict], pd.DataFrame],
+                          existing_filepath: str,
+                          fuzzy: bool = False) -> Tuple[List[Dict], List[Dict], Dict]:
+    """
+    Compara datos nuevos (lista de dicts o DataFrame) con Excel existente.
+    Con fuzzy=True también marca como duplicados los nombres casi iguales
+    (MinHash/LSH sobre 3-gramas) a uno del Excel existente.
+    Retorna: (datos_nuevos, datos_duplicados, info_duplicados)
+    """
+    is_frame = isinstance(new_data, pd.DataFrame)
+    if not os.path.exists(existing_filepath):
+        return (new_data.to_dict('records') if is_frame else new_data), [], {}
+
+    # Claves existentes normalizadas (desde la cache si el maestro no cambió)
+    master = _master_keys(existing_filepath)
+    exist_named = master[master['Nombre'] != '']
+    existing_by_name = pd.Index(exist_named['name_key']).unique()
+    existing_by_website = pd.Index(master['website_key'][master['website_key'] != '']).unique()
+
+    # Claves de los datos nuevos y pertenencia por hash (isin)
+    df_new = new_data if is_frame else pd.DataFrame(new_data)
+    names = _text_column(df_new, 'Nombre')
+    websites = _text_column(df_new, 'Página Web', 'Pagina Web')
+    name_keys = _normalize_series(names)
+    website_keys = _normalize_series(websites.where(websites != 'N/A', ''))
+
+    dup_by_name = (name_keys != '') & name_keys.isin(existing_by_name)
+    dup_by_website = (website_keys != '') & website_keys.isin(existing_by_website)
+    dup_mask = dup_by_name | dup_by_website
+
+    # Pase difuso opcional: solo sobre los que no son duplicados exactos
+    similar_to = pd.Series('', index=df_new.index, dtype=object)
+    if fuzzy:
+        pending = ~dup_mask
+        similar_to[pending] = _fuzzy_matches(
+            name_keys[pending], pd.Series(exist_named['Nombre'].values, index=exist_named['name_key'].values))
+        dup_mask = dup_mask | (similar_to != '')
 
     # Clasificar datos nuevos
-    nuevos = []
-    duplicados = []
-    info_duplicados = {}
+    if is_frame:
+        nuevos = df_new[~dup_mask].to_dict('records')
+        duplicados = df_new[dup_mask].to_dict('records')
+    else:
+        nuevos = list(compress(new_data, ~dup_mask))
+        duplicados = list(compress(new_data, dup_mask))
 
-    for item in new_data:
-        nombre = item.get('Nombre', '').strip()
-        website = item.get('Página Web', '').strip()
-
-        # Verificar duplicados
-        name_key = normalize_key(nombre)
-        website_key = normalize_key(website) if website and website != 'N/A' else ''
-
-        duplicated_by_name = name_key in existing_by_name
-        duplicated_by_website = website_key and website_key in existing_by_website
-
-        if duplicated_by_name or duplicated_by_website:
-            duplicados.append(item)
-            reason = []
-            if duplicated_by_name:
-                reason.append(f"Nombre: {nombre}")
-            if duplicated_by_website:
-                reason.append(f"Web: {website}")
-
-            info_duplicados[nombre] = {
-                'reason': ' | '.join(reason),
-                'website': website,
-                'telefono': item.get('Teléfono', ''),
-                'whatsapp': item.get('WhatsApp', '')
-            }
-        else:
-            nuevos.append(item)
+    info_duplicados = {}
+    for item, nombre, website, duplicated_by_name, duplicated_by_website, similar in zip(
+            duplicados, names[dup_mask], websites[dup_mask],
+            dup_by_name[dup_mask], dup_by_website[dup_mask], similar_to[dup_mask]):
+        reason = []
+        if duplicated_by_name:
+            reason.append(f"Nombre: {nombre}")
+        if duplicated_by_website:
+            reason.append(f"Web: {website}")
+        if similar:
+            reason.append(f"Nombre similar: {similar}")
+
+        info_duplicados[nombre] = {
+            'reason': ' | '.join(reason),
+            'website': website,
+            'telefono': item.get('Teléfono', ''),
+            'whatsapp': item.get('WhatsApp', '')
+        }
 
     return nuevos, duplicados, info_duplicados
 
@@ -130,27 +296,42 @@ def save_filtered_output(original_output_path: str, filtered_data: List[Dict], s
     if not filtered_data:
         return None
 
-    # Limpiar valores en los datos
-    cleaned_data = []
-    for item in filtered_data:
-        cleaned_item = {}
-        for key, value in item.items():
-            cleaned_item[key] = clean_value(value)
-        cleaned_data.append(cleaned_item)
+    # Limpiar valores por columna (misma regla que clean_value, sin recorrer celda a celda);
+    # dtype=object conserva cada valor tal cual (un 1 entero no pasa a 1.0)
+    df = pd.DataFrame(filtered_data, dtype=object)
+    for col in df.columns:
+        values = df[col]
+        text = values.map(str).str.strip()
+        df[col] = text.where(values.notna() & (text != ''), 'N/A')
+
+    # Claves ausentes en algunos registros quedan vacías, no como 'N/A'
+    first_keys = filtered_data[0].keys()
+    if any(item.keys() != first_keys for item in filtered_data):
+        present = pd.DataFrame([dict.fromkeys(item, True) for item in filtered_data], columns=df.columns)
+        df = df.where(present.notna())
 
     # Crear nombre del archivo filtrado
     path_obj = Path(original_output_path)
     new_filename = f"{path_obj.stem}{suffix}{path_obj.suffix}"
     filtered_path = path_obj.parent / new_filename
 
-    # Crear DataFrame y guardar
-    df = pd.DataFrame(cleaned_data)
-    df.to_excel(filtered_path, index=False)
+    write_frame_xlsx(df, str(filtered_path))
 
     return str(filtered_path)
 
 
+# Nombre de los archivos de resultados: output_{ciudad}_{tipo}_{AAAAMMDD}_{HHMMSS}.xlsx
+_OUTPUT_NAME_RE = re.compile(
+    r'^output_(?P<ciudad>.+?)_(?P<tipo>hoteles|restaurantes|tiendas|empresas|negocios)_\d{8}_\d{6}\.xlsx$'
+)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Verifica duplicados antes del merge final.")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="Marca también como duplicados los nombres casi iguales (MinHash/LSH)")
+    args = parser.parse_args()
+
     print("=" * 80)
     print("🔍 PRE-MERGE - Verificación de Duplicados")
     print("=" * 80)
@@ -176,8 +357,7 @@ def main():
 
     # Leer datos nuevos
     try:
-        df_new = pd.read_excel(output_file)
-        new_data = df_new.to_dict('records')
+        new_data = read_xlsx_records(output_file)
         print(f"✅ Leídos {len(new_data)} registros del archivo de salida")
     except Exception as e:
         print(f"❌ Error leyendo archivo de salida: {e}")
@@ -186,7 +366,7 @@ def main():
     # Comparar con existentes
     print()
     print("🔍 Comparando con datos existentes...")
-    nuevos, duplicados, info_duplicados = compare_with_existing(new_data, input_file)
+    nuevos, duplicados, info_duplicados = compare_with_existing(new_data, input_file, fuzzy=args.fuzzy)
 
     # Mostrar resultados
     print()
@@ -235,27 +415,13 @@ def main():
                     return 1
 
                 # Obtener información de búsqueda del archivo original
+                # (formato: output_{ciudad}_{tipo}_{timestamp}.xlsx)
                 ciudad = None
                 tipo_negocio = None
-                filename = Path(output_file).name
-
-                # Extraer info del nombre del archivo (formato: output_{ciudad}_{tipo}_{timestamp}.xlsx)
-                parts = filename.replace('output_', '').replace('.xlsx', '').split('_')
-                if len(parts) >= 3:
-                    ciudad_parts = []
-                    tipo_parts = []
-
-                    # Ciudad hasta encontrar el tipo
-                    for part in parts[:-2]:  # Excluir timestamp
-                        if part in ['hoteles', 'restaurantes', 'tiendas', 'empresas', 'negocios']:
-                            tipo_parts.append(part)
-                        else:
-                            ciudad_parts.append(part)
-
-                    if ciudad_parts:
-                        ciudad = ' '.join(ciudad_parts).replace('_', ' ')
-                    if tipo_parts:
-                        tipo_negocio = ' '.join(tipo_parts)
+                match = _OUTPUT_NAME_RE.match(Path(output_file).name)
+                if match:
+                    ciudad = match['ciudad'].replace('_', ' ')
+                    tipo_negocio = match['tipo']
 
                 if not ciudad or not tipo_negocio:
                     print("❌ No se pudo determinar la ciudad/tipo de negocio del archivo")
@@ -6,7 +6,6 @@ Flujo completo: backup → búsqueda → generación Excel para revisión.
 import os
 import sys
 from datetime import datetime
-from pathlib import Path
 from dotenv import load_dotenv
 
 # Añadir src al path
@@ -14,18 +13,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.business_processor import BusinessDataProcessor
 from src.output_writer import OutputWriter
-
-
-def find_input_excel():
-    """Busca el archivo Excel en data/input/."""
-    input_dir = Path("data/input")
-    if not input_dir.exists():
-        return None
-    
-    excel_files = list(input_dir.glob("*.xlsx")) + list(input_dir.glob("*.xls"))
-    if excel_files:
-        return str(excel_files[0])  # Retorna el primero encontrado
-    return None
+from src.utils import find_input_excel
 
 
 def validate_positive_int(prompt: str) -> int:
@@ -180,30 +180,39 @@ class BusinessDataProcessor:
         }
     
     def process_batch(self, items: List[Dict], scan_emails: bool = True, 
-                     delay: float = 1.0, city: str = "") -> List[Dict]:
-        """Procesa un lote de items."""
+                     delay: float = 1.0, city: str = "",
+                     workers: Optional[int] = None) -> List[Dict]:
+        """Procesa un lote de items.
+
+        `workers` sustituye a self.workers solo en esta llamada (el procesador
+        puede estar compartido entre sesiones con distinto número de workers).
+        """
         results = []
+        workers = self.workers if workers is None else workers
         
-        if self.workers > 1 and len(items) > 1:
+        if workers > 1 and len(items) > 1:
             # Procesamiento paralelo
-            self.output_writer.print(f"[i] Ejecutando con {self.workers} workers...")
+            self.output_writer.print(f"[i] Ejecutando con {workers} workers...")
             
-            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
                 futures = {
-                    executor.submit(self.process_item, item, scan_emails, city): item 
-                    for item in items
+                    executor.submit(self.process_item, item, scan_emails, city): idx 
+                    for idx, item in enumerate(items)
                 }
                 
+                # Guardar por índice para devolver los resultados en el orden de entrada
+                results_by_index = {}
                 for i, future in enumerate(as_completed(futures), 1):
                     try:
-                        result = future.result()
-                        results.append(result)
+                        results_by_index[futures[future]] = future.result()
                     except Exception as e:
                         self.output_writer.print(f"[warn] Error en worker: {e}")
                         continue
                     
                     if i % 20 == 0:
                         self.output_writer.print(f"[i] Procesados {i}/{len(items)} ...")
+                
+                results = [results_by_index[idx] for idx in sorted(results_by_index)]
         else:
             # Procesamiento secuencial
             for i, item in enumerate(items, 1):
@@ -2,11 +2,16 @@
 Escritura de resultados en diferentes formatos.
 """
 import os
+import re
+import sys
 import time
 import random
-from typing import List, Dict
+import importlib.util
+from typing import List, Dict, Union
 import pandas as pd
-from openpyxl import load_workbook
+from pandas.io.formats.excel import ExcelFormatter
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 
 # Google Sheets integration has been removed from the core writer to keep
@@ -15,6 +20,224 @@ from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 gspread = None
 SACredentials = None
 
+# Motor para pd.read_excel: python-calamine (Rust) es bastante más rápido que
+# openpyxl leyendo XLSX. Si no está instalado se usa el motor por defecto.
+EXCEL_READ_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+# Textos que pd.read_excel convierte en NaN por defecto (na_values)
+EXCEL_NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+def _excel_value(value):
+    """Valor de celda como lo deja pd.read_excel: None para los textos NA ('N/A', ...)."""
+    return None if isinstance(value, str) and value in EXCEL_NA_STRINGS else value
+
+
+def _read_xlsx_rows(filepath: str, columns=None):
+    """Encabezado y filas no vacías (tuplas) de la hoja activa de un .xlsx.
+
+    Se recorre con openpyxl en modo read_only. Los textos de EXCEL_NA_STRINGS
+    (p. ej. el 'N/A' que escribe write_to_excel) se devuelven como None, igual
+    que con pd.read_excel. Si se pasa `columns`, solo se conservan esas
+    columnas (el número de filas no cambia).
+    """
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return [], []
+        # Mismo nombre que pandas para encabezados vacíos
+        header = [h if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        rows = [row for row in rows if any(v is not None for v in row)]
+        if columns is None:
+            return header, [tuple(map(_excel_value, row)) for row in rows]
+        keep = [i for i, h in enumerate(header) if h in columns]
+        return ([header[i] for i in keep],
+                [tuple(_excel_value(row[i]) if i < len(row) else None for i in keep)
+                 for row in rows])
+    finally:
+        wb.close()
+
+
+def _read_xls(filepath: str, columns=None) -> pd.DataFrame:
+    """Lectura con pandas para .xls (openpyxl no los soporta)."""
+    usecols = (lambda c: c in columns) if columns is not None else None
+    return pd.read_excel(filepath, engine=EXCEL_READ_ENGINE, usecols=usecols)
+
+
+def read_xlsx_records(filepath: str, columns=None) -> List[Dict]:
+    """Lee la hoja activa de un Excel como lista de dicts, sin construir un DataFrame.
+
+    Los .xlsx se recorren fila a fila con openpyxl en modo read_only; los .xls
+    (que openpyxl no soporta) se leen con pandas. Si se pasa `columns`, cada
+    registro solo incluye esas columnas (el número de filas no cambia).
+    """
+    if not filepath.lower().endswith('.xlsx'):
+        return _read_xls(filepath, columns).to_dict('records')
+    header, rows = _read_xlsx_rows(filepath, columns)
+    return [dict(zip(header, row)) for row in rows]
+
+
+def read_xlsx_frame(filepath: str, columns=None) -> pd.DataFrame:
+    """Como read_xlsx_records, pero como DataFrame construido desde las tuplas
+    de filas (sin un dict intermedio por fila)."""
+    if not filepath.lower().endswith('.xlsx'):
+        return _read_xls(filepath, columns)
+    header, rows = _read_xlsx_rows(filepath, columns)
+    return pd.DataFrame(rows, columns=header)
+
+
+def read_excel_header(filepath: str) -> List[str]:
+    """Encabezados de la hoja activa (sin espacios), leyendo solo la primera fila."""
+    if not filepath.lower().endswith('.xlsx'):
+        columns = pd.read_excel(filepath, engine=EXCEL_READ_ENGINE, nrows=0).columns
+        return [str(c).strip() for c in columns]
+
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        header = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+        return [str(h).strip() if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+    finally:
+        wb.close()
+
+
+def excel_row_count(filepath: str) -> int:
+    """Cuenta los registros (filas sin el encabezado) de un Excel sin crear un DataFrame.
+
+    Usa la altura de la hoja de calamine, nrows de xlrd (.xls) o max_row de
+    openpyxl en modo read-only; solo si ninguno sirve hace una lectura completa.
+    """
+    if EXCEL_READ_ENGINE == "calamine":
+        # calamine (si está instalado) da la altura de la hoja para .xlsx y .xls.
+        # get_sheet_by_index parsea la hoja entera (en Rust), pero no crea el DataFrame
+        try:
+            from python_calamine import CalamineWorkbook
+            workbook = CalamineWorkbook.from_path(filepath)
+            try:
+                return max(workbook.get_sheet_by_index(0).height - 1, 0)
+            finally:
+                # close() existe desde python-calamine 0.3; antes se libera con el objeto
+                close = getattr(workbook, "close", None)
+                if close is not None:
+                    close()
+        except Exception:
+            pass
+    try:
+        if filepath.lower().endswith('.xls'):
+            # .xls: xlrd (el mismo lector que usa pandas) da nrows sin crear el DataFrame
+            import xlrd
+            book = xlrd.open_workbook(filepath, on_demand=True)
+            try:
+                return max(book.sheet_by_index(0).nrows - 1, 0)
+            finally:
+                book.release_resources()
+
+        wb = load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            max_row = wb.active.max_row
+        finally:
+            wb.close()
+        if max_row:
+            return max(max_row - 1, 0)
+    except Exception:
+        pass
+    # Sin xlrd o archivo sin dimensiones declaradas: lectura completa
+    return len(pd.read_excel(filepath, engine=EXCEL_READ_ENGINE))
+
+
+# to_excel da estilo al encabezado hasta pandas 2.x (ExcelFormatter.header_style);
+# pandas 3 lo escribe sin formato. El camino openpyxl de write_frame_xlsx copia
+# lo que haga la versión instalada
+_TO_EXCEL_STYLES_HEADER = hasattr(ExcelFormatter, "header_style")
+_TO_EXCEL_HEADER_FONT = Font(bold=True)
+_TO_EXCEL_HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
+                                 top=Side(style='thin'), bottom=Side(style='thin'))
+_TO_EXCEL_HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+
+def write_frame_xlsx(df: pd.DataFrame, filepath: str) -> None:
+    """Equivalente a df.to_excel(filepath, index=False) escribiendo en streaming.
+
+    Usa xlsxwriter con constant_memory si está instalado; si no, openpyxl en
+    modo write_only. En ambos casos las filas van a disco sin construir la hoja
+    completa en memoria, con el mismo encabezado que escribiría to_excel.
+    """
+    if importlib.util.find_spec("xlsxwriter"):
+        with pd.ExcelWriter(filepath, engine="xlsxwriter",
+                            engine_kwargs={"options": {"constant_memory": True}}) as writer:
+            df.to_excel(writer, index=False)
+        return
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="Sheet1")
+    if _TO_EXCEL_STYLES_HEADER:
+        # Mismo encabezado que to_excel en pandas 2.x: negrita, borde fino, centrado arriba
+        header = []
+        for col_name in df.columns:
+            cell = WriteOnlyCell(ws, value=str(col_name))
+            cell.font = _TO_EXCEL_HEADER_FONT
+            cell.border = _TO_EXCEL_HEADER_BORDER
+            cell.alignment = _TO_EXCEL_HEADER_ALIGNMENT
+            header.append(cell)
+        ws.append(header)
+    else:
+        ws.append([str(col_name) for col_name in df.columns])
+    # NaN -> celda vacía (igual que to_excel)
+    for values in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        ws.append(values)
+    wb.save(filepath)
+
+
+# Columnas de los datos nuevos que el merge consulta además de las del Excel
+# existente: clave de respaldo y reparto de teléfonos
+_MERGE_EXTRA_COLUMNS = ('Nombre', 'WhatsApp', 'Telefono', 'Teléfono', 'phone')
+
+
+def merge_columns(existing_filepath: str, key_priority: List[str] = None) -> set:
+    """Columnas de los datos nuevos que usa merge_into_existing_excel con este Excel.
+
+    Sirve para leer el archivo de resultados solo con lo necesario
+    (read_xlsx_frame(..., columns=merge_columns(...))).
+    """
+    if key_priority is None:
+        key_priority = ["Pagina Web", "Nombre"]
+    return set(read_excel_header(existing_filepath)) | set(key_priority) | set(_MERGE_EXTRA_COLUMNS)
+
+
+def _clean_text(values: pd.Series) -> pd.Series:
+    """Versión vectorizada de clean_value: NaN/None -> '', el resto como texto sin espacios."""
+    return values.astype(object).where(values.notna(), '').astype(str).str.strip()
+
+
+def _first_non_empty(*columns: pd.Series) -> pd.Series:
+    """Por fila, el primer valor no vacío entre las columnas dadas (en orden)."""
+    result = columns[0]
+    for values in columns[1:]:
+        result = result.where(result != '', values)
+    return result
+
+
+def _normalize_keys(values: pd.Series) -> pd.Series:
+    """Normaliza claves de merge: minúsculas, sin http(s)://, sin www. y solo [a-z0-9]."""
+    return (values.astype(str).str.lower().str.strip()
+            .str.replace(r'^https?://', '', regex=True)
+            .str.replace(r'^www\.', '', regex=True)
+            .str.replace(r'[^a-z0-9]', '', regex=True))
+
+
+def _looks_like_mobile(phones: pd.Series) -> pd.Series:
+    """Heurística de celular colombiano (empieza por 3, con o sin prefijo 57)."""
+    digits = phones.str.replace(r'\D', '', regex=True).str.replace(r'^57', '', regex=True)
+    return digits.str.startswith('3')
+
+
+# Palabra con los espacios que la siguen (los espacios iniciales van solos)
+_WORD_RE = re.compile(r"\S+\s*|\s+")
+
 
 def human_print(text: str, humanize: bool = False, speed: float = 0.02):
     """Print texto simulando tipeo humano. Si humanize=False hace print normal."""
@@ -22,10 +245,13 @@ def human_print(text: str, humanize: bool = False, speed: float = 0.02):
         print(text)
         return
     
-    # Simular tipeo con posibles typos leves y corrección
-    for ch in text:
-        print(ch, end="", flush=True)
-        time.sleep(speed * (0.5 + random.random()))
+    # Escribir palabra a palabra: una escritura y un flush por palabra (no por
+    # carácter); la pausa es la suma de las pausas por carácter de la palabra
+    write, flush, rand = sys.stdout.write, sys.stdout.flush, random.random
+    for word in _WORD_RE.findall(text):
+        time.sleep(speed * sum(0.5 + rand() for _ in word))
+        write(word)
+        flush()
     print()
 
 
@@ -78,6 +304,7 @@ class OutputWriter:
         
         Si use_template_columns=True, usa solo las columnas básicas del template
         (Nombre, WhatsApp, Telefono, Correo, Pagina Web, Ciudad) sin campos de debug.
+        Devuelve el DataFrame escrito (mismas columnas y valores que el archivo).
         """
         if not data:
             self.print("[warn] No hay datos para escribir")
@@ -162,55 +389,50 @@ class OutputWriter:
 
             df_out = df[target_cols]
 
-        # Escribir usando pandas y luego estilizar encabezado con openpyxl
-        df_out.to_excel(filepath, index=False, engine="openpyxl")
+        # Escribir en modo streaming (write_only) aplicando estilos celda a celda,
+        # sin volver a cargar el archivo para estilizarlo
+        header_fill = PatternFill(start_color="FFF59D", end_color="FFF59D", fill_type="solid")
+        header_font = Font(bold=True)
+        center_alignment = Alignment(horizontal="center", vertical="center")
+
+        # Definir borde completo
+        thin_border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
 
-        try:
-            wb = load_workbook(filepath)
-            ws = wb.active
-            
-            # Definir estilos
-            header_fill = PatternFill(start_color="FFF59D", end_color="FFF59D", fill_type="solid")
-            header_font = Font(bold=True)
-            header_alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Definir borde completo
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            # Obtener índices de columnas que necesitan alineación centrada
-            columns_to_center = []
-            for col_idx, col_name in enumerate(df_out.columns, start=1):
-                if col_name in ['WhatsApp', 'Telefono', 'Correo']:
-                    columns_to_center.append(col_idx)
-            
-            # Aplicar estilos al encabezado
-            for cell in ws[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = header_alignment
+        # Columnas que necesitan alineación centrada
+        centered = [col_name in ['WhatsApp', 'Telefono', 'Correo'] for col_name in df_out.columns]
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title="Sheet1")
+
+        header = []
+        for col_name in df_out.columns:
+            cell = WriteOnlyCell(ws, value=col_name)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = center_alignment
+            cell.border = thin_border
+            header.append(cell)
+        ws.append(header)
+
+        for values in df_out.itertuples(index=False, name=None):
+            row = []
+            for value, center in zip(values, centered):
+                cell = WriteOnlyCell(ws, value=value)
                 cell.border = thin_border
-            
-            # Aplicar estilos a las filas de datos
-            for row in range(2, ws.max_row + 1):
-                for col in range(1, ws.max_column + 1):
-                    cell = ws.cell(row=row, column=col)
-                    cell.border = thin_border
-                    
-                    # Aplicar alineación centrada a columnas específicas
-                    if col in columns_to_center:
-                        cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            wb.save(filepath)
-        except Exception:
-            # Si falla el formateo, no interrumpir el flujo
-            pass
+                if center:
+                    cell.alignment = center_alignment
+                row.append(cell)
+            ws.append(row)
+
+        wb.save(filepath)
 
         self.print(f"[✓] Archivo Excel guardado -> {filepath}")
+        return df_out
     
     def write_to_txt(self, data: List[Dict], filepath: str, separator: str = " | "):
         """Escribe datos a archivo de texto simple."""
@@ -268,7 +490,8 @@ class OutputWriter:
         self.print(f"[✓] Backup creado -> {backup_path}")
         return backup_path
 
-    def merge_into_existing_excel(self, existing_filepath: str, data: List[Dict], key_priority: list = None, output_dir: str = None):
+    def merge_into_existing_excel(self, existing_filepath: str, data: Union[List[Dict], pd.DataFrame],
+                                  key_priority: list = None, output_dir: str = None):
         """Fusiona `data` (lista de dicts) dentro de un archivo Excel existente.
 
         Reglas:
@@ -284,51 +507,63 @@ class OutputWriter:
 
         Parámetros:
         - existing_filepath: ruta al archivo Excel original (NO se modifica).
-        - data: lista de diccionarios con datos procesados.
+        - data: DataFrame (o lista de diccionarios) con datos procesados. Las
+          reglas se aplican por columnas; una lista se convierte una sola vez.
         - key_priority: lista de columnas a usar como clave en orden de preferencia.
         - output_dir: directorio donde guardar el merge (default: data/merged/).
         
         Retorna:
         - Tupla (merged_filepath, renamed_original_filepath)
         """
-        import re
         import shutil
-        import re
-        import shutil
-        from openpyxl.styles import Font, PatternFill, Alignment
 
-        # Helper to clean values (handle NaN, None, etc.)
-        def clean_value(val):
-            if val is None or (isinstance(val, float) and str(val) == 'nan'):
-                return ''
-            return str(val).strip()
+        # Trabajar por columnas: una lista de dicts se convierte una sola vez.
+        # dtype=object conserva cada valor tal cual (un entero con huecos en la
+        # columna no pasa a float: 6041234567 no se escribe como 6041234567.0)
+        is_frame = isinstance(data, pd.DataFrame)
+        records = None if is_frame else list(data or [])
+        df_new = data.reset_index(drop=True) if is_frame else pd.DataFrame(records, dtype=object)
 
-        if not data:
+        if df_new.empty:
             self.print("[warn] No hay datos para fusionar en Excel existente")
             return None, None
-        
+
+        # Qué registros traen cada columna (la clave existe, aunque el valor sea
+        # None): solo esos escriben en el Excel, igual que `col in item`
+        has = pd.DataFrame(True, index=df_new.index, columns=df_new.columns)
+        if records is not None:
+            first_keys = records[0].keys()
+            if any(item.keys() != first_keys for item in records):
+                has = pd.DataFrame([dict.fromkeys(item, True) for item in records],
+                                   columns=df_new.columns).notna()
+
+        def column(name: str) -> pd.Series:
+            """Columna limpia de los datos nuevos ('' si no existe o es NaN)."""
+            if name not in df_new.columns:
+                return pd.Series('', index=df_new.index, dtype=object)
+            return _clean_text(df_new[name])
+
+        def present(name: str) -> pd.Series:
+            """Filas de los datos nuevos que traen la columna."""
+            if name not in has.columns:
+                return pd.Series(False, index=df_new.index)
+            return has[name]
+
         # NO filtrar filas sin teléfono ni WhatsApp - mantener todas las filas
-        # pero asegurar que tengan valores válidos
-        filtered_data = []
-        for item in data:
-            # Limpiar valores y asegurar que no sean NaN
-            whatsapp = clean_value(item.get('WhatsApp', ''))
-            telefono = clean_value(item.get('Telefono', ''))
-            telefono_alt = clean_value(item.get('Teléfono', ''))
-            
-            # Si no hay teléfono ni WhatsApp, poner N/A
-            if not whatsapp and not telefono and not telefono_alt:
-                # Crear una copia del item con valores N/A
-                cleaned_item = item.copy()
-                cleaned_item['WhatsApp'] = 'N/A'
-                cleaned_item['Telefono'] = 'N/A'
-                if 'Teléfono' in cleaned_item:
-                    cleaned_item['Teléfono'] = 'N/A'
-                filtered_data.append(cleaned_item)
-            else:
-                filtered_data.append(item)
-        
-        self.print(f"[i] Todas las filas mantenidas: {len(filtered_data)} de {len(data)}")
+        # pero marcar con N/A las que no tengan ninguno
+        no_phone = (column('WhatsApp') == '') & (column('Telefono') == '') & (column('Teléfono') == '')
+        if no_phone.any():
+            if is_frame:
+                df_new = df_new.copy()  # no modificar el DataFrame del llamador
+            for col in ('WhatsApp', 'Telefono', 'Teléfono'):
+                if col in df_new.columns:
+                    df_new[col] = df_new[col].astype(object)
+                elif col == 'Teléfono':
+                    continue
+                else:
+                    has[col] = False
+                df_new.loc[no_phone, col] = 'N/A'
+                has.loc[no_phone, col] = True
 
         if key_priority is None:
             key_priority = ["Pagina Web", "Nombre"]
@@ -337,12 +572,8 @@ class OutputWriter:
         if not os.path.exists(existing_filepath):
             raise FileNotFoundError(f"No existe el archivo Excel: {existing_filepath}")
 
-        # Cargar con openpyxl para preservar estilos
-        wb_original = load_workbook(existing_filepath)
-        ws_original = wb_original.active
-        
         # Leer con pandas para manipulación de datos
-        df_exist = pd.read_excel(existing_filepath)
+        df_exist = pd.read_excel(existing_filepath, engine=EXCEL_READ_ENGINE)
 
         # Normalizar columnas: strip
         df_exist.columns = [str(c).strip() for c in df_exist.columns]
@@ -362,103 +593,69 @@ class OutputWriter:
             else:
                 key_col = df_exist.columns[0]
 
-        def normalize_key(val: str) -> str:
-            if val is None:
-                return ""
-            s = str(val).lower().strip()
-            # remove protocol and www
-            s = re.sub(r'^https?://', '', s)
-            s = re.sub(r'^www\.', '', s)
-            # remove non-alphanumeric
-            s = re.sub(r'[^a-z0-9]', '', s)
-            return s
-
-        # Build mapping of existing keys -> row index
-        existing_keys = df_exist.get(key_col, pd.Series([""] * len(df_exist))).fillna("")
-        existing_map = {normalize_key(v): i for i, v in enumerate(existing_keys)}
-
-        # Helper to determine if a phone looks like mobile (quick heuristic)
-        def looks_like_mobile(phone: str) -> bool:
-            if not phone:
-                return False
-            digits = re.sub(r'\D', '', str(phone))
-            if digits.startswith('57'):
-                digits = digits[2:]
-            # In Colombia mobiles start with '3' (e.g., 300,311,312,320...)
-            return digits.startswith('3')
-
-        # Iterate filtered_data and merge
-        for item in filtered_data:
-            # build item key using same priority
-            item_key_val = ""
-            for k in key_priority:
-                if k in item and item[k]:
-                    item_key_val = item[k]
-                    break
-            if not item_key_val:
-                # fallback to Nombre
-                item_key_val = item.get('Nombre', '')
-
-            nkey = normalize_key(item_key_val)
-
-            if nkey in existing_map:
-                idx = existing_map[nkey]
-                # Update only columns that exist in df_exist and in item
-                for col in existing_cols:
-                    if col in item and col not in [None, 'Unnamed: 0']:
-                        # Special handling: distribute phone between WhatsApp/Telefono
-                        if col == 'WhatsApp':
-                            # prefer explicit 'WhatsApp' in item, else try to detect
-                            val = clean_value(item.get('WhatsApp')) or clean_value(item.get('Telefono')) or clean_value(item.get('Teléfono'))
-                            if val and not looks_like_mobile(val):
-                                # if detected as non-mobile, skip writing to WhatsApp
-                                continue
-                            df_exist.at[idx, col] = val
-                        elif col == 'Telefono':
-                            val = clean_value(item.get('Telefono')) or clean_value(item.get('Teléfono')) or clean_value(item.get('phone'))
-                            # if this looks like mobile, prefer WhatsApp instead
-                            if val and looks_like_mobile(val):
-                                # if Telefono column exists but we have a mobile, leave Telefono empty
-                                # unless Telefono is empty and WhatsApp column doesn't exist
-                                if 'WhatsApp' not in df_exist.columns:
-                                    df_exist.at[idx, col] = val
-                                else:
-                                    # skip writing mobile into Telefono
-                                    pass
-                            else:
-                                df_exist.at[idx, col] = val
-                        else:
-                            df_exist.at[idx, col] = item.get(col, df_exist.at[idx, col])
-            else:
-                # Row not found: append a new row but only with existing columns
-                new_row = {c: '' for c in existing_cols}
-                for c in existing_cols:
-                    if c in item:
-                        # map phone heuristics as above
-                        if c == 'WhatsApp':
-                            val = clean_value(item.get('WhatsApp')) or clean_value(item.get('Telefono')) or clean_value(item.get('Teléfono'))
-                            if val and not looks_like_mobile(val):
-                                # don't insert non-mobile into WhatsApp
-                                continue
-                            new_row[c] = val
-                        elif c == 'Telefono':
-                            val = clean_value(item.get('Telefono')) or clean_value(item.get('Teléfono')) or clean_value(item.get('phone'))
-                            if val and looks_like_mobile(val):
-                                if 'WhatsApp' not in existing_cols:
-                                    new_row[c] = val
-                                else:
-                                    # skip mobile into Telefono when WhatsApp exists
-                                    pass
-                            else:
-                                new_row[c] = val
-                        else:
-                            new_row[c] = clean_value(item.get(c, ''))
-                    elif c == 'Unnamed: 0':
-                        # Para la columna de índice, usar el próximo índice disponible
-                        new_row[c] = len(df_exist)
-                
-                # Usar loc en lugar de concat para mayor confiabilidad
-                df_exist.loc[len(df_exist)] = new_row
+        # Mapa clave normalizada -> fila existente (si se repite, gana la última)
+        existing_keys = _normalize_keys(df_exist[key_col].fillna(""))
+        existing_map = pd.Series(range(len(df_exist)), index=existing_keys.to_numpy())
+        existing_map = existing_map[~existing_map.index.duplicated(keep='last')]
+
+        # Clave de cada dato nuevo: primera columna de key_priority con valor, o 'Nombre'
+        raw_keys = column('Nombre')
+        assigned = pd.Series(False, index=df_new.index)
+        for k in key_priority:
+            if k in df_new.columns:
+                take = ~assigned & df_new[k].notna() & (df_new[k].astype(str) != '')
+                raw_keys = raw_keys.where(~take, df_new[k].astype(str))
+                assigned |= take
+        target = _normalize_keys(raw_keys).map(existing_map)
+        matched = target.notna()
+        target = target.fillna(-1).astype(int)
+
+        # Reparto de teléfonos entre WhatsApp / Telefono (mismas reglas para updates y filas nuevas)
+        has_whatsapp_col = 'WhatsApp' in existing_cols
+        whatsapp_val = _first_non_empty(column('WhatsApp'), column('Telefono'), column('Teléfono'))
+        telefono_val = _first_non_empty(column('Telefono'), column('Teléfono'), column('phone'))
+        # WhatsApp: no escribir un número que no parece celular
+        whatsapp_ok = (whatsapp_val == '') | _looks_like_mobile(whatsapp_val)
+        # Telefono: no escribir un celular si existe la columna WhatsApp
+        telefono_ok = (telefono_val == '') | ~_looks_like_mobile(telefono_val) | (not has_whatsapp_col)
+
+        def values_for(col: str, raw: bool):
+            """Valores a escribir en `col` y máscara de filas donde corresponde escribir."""
+            if col == 'WhatsApp':
+                return whatsapp_val, present(col) & whatsapp_ok
+            if col == 'Telefono':
+                return telefono_val, present(col) & telefono_ok
+            return (df_new[col] if raw else column(col)), present(col)
+
+        # Actualizar filas existentes (si varias coinciden con la misma fila, gana la última)
+        if matched.any():
+            for col in existing_cols:
+                if col == 'Unnamed: 0' or col not in df_new.columns:
+                    continue
+                values, write = values_for(col, raw=True)
+                write &= matched
+                if not write.any():
+                    continue
+                last = values[write].groupby(target[write], sort=False).last()
+                df_exist[col] = df_exist[col].astype(object)
+                df_exist.loc[last.index, col] = last.to_numpy()
+
+        # Filas sin coincidencia: se añaden al final solo con las columnas existentes
+        new_mask = ~matched
+        if new_mask.any():
+            n_new = int(new_mask.sum())
+            new_rows = pd.DataFrame('', index=range(n_new), columns=existing_cols, dtype=object)
+            for col in existing_cols:
+                if col in df_new.columns:
+                    values, write = values_for(col, raw=False)
+                    write = write[new_mask].to_numpy()
+                    new_rows.loc[write, col] = values[new_mask].to_numpy()[write]
+                if col == 'Unnamed: 0':
+                    # Para la columna de índice, usar el próximo índice disponible
+                    fill = ~present(col)[new_mask].to_numpy()
+                    next_index = pd.RangeIndex(len(df_exist), len(df_exist) + n_new).to_numpy()
+                    new_rows.loc[fill, col] = next_index[fill]
+            df_exist = pd.concat([df_exist, new_rows], ignore_index=True)
 
         # Preparar paths para el merge
         if output_dir is None:
@@ -479,41 +676,42 @@ class OutputWriter:
             f"{name_without_ext} - original{ext}"
         )
         
-        # Escribir el merged con pandas (temporal)
-        temp_file = merged_filepath + '.tmp' + ext
-        df_exist.to_excel(temp_file, index=False, engine='openpyxl')
-        
-        # Cargar el merged temporal con openpyxl para aplicar estilos
-        wb_merged = load_workbook(temp_file)
-        ws_merged = wb_merged.active
-        
-        # Copiar estilos del header original (fila 1)
+        # Escribir el merged en modo streaming (write_only) con los estilos ya
+        # aplicados, sin archivo temporal ni recarga para estilizar
         header_fill = PatternFill(start_color="FFFFFF00", end_color="FFFFFF00", fill_type="solid")
         header_font = Font(name="Aptos Narrow", bold=True, size=16)
         header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        for col_idx, cell in enumerate(ws_merged[1], start=1):
+
+        # Estilos de datos (fondo verde claro); primera columna (índice) en bold
+        data_fill = PatternFill(start_color="FFC1F0C8", end_color="FFC1F0C8", fill_type="solid")
+        data_font = Font(name="Aptos Narrow", bold=False, size=11)
+        first_col_font = Font(name="Aptos Narrow", bold=True, size=11)
+
+        wb_merged = Workbook(write_only=True)
+        ws_merged = wb_merged.create_sheet(title="Sheet1")
+
+        header = []
+        for col_name in df_exist.columns:
+            cell = WriteOnlyCell(ws_merged, value=col_name)
             cell.fill = header_fill
             cell.font = header_font
             cell.alignment = header_alignment
-        
-        # Copiar estilos de datos (fondo verde claro)
-        data_fill = PatternFill(start_color="FFC1F0C8", end_color="FFC1F0C8", fill_type="solid")
-        data_font = Font(name="Aptos Narrow", bold=False, size=11)
-        
-        for row_idx in range(2, ws_merged.max_row + 1):
-            for col_idx in range(1, ws_merged.max_column + 1):
-                cell = ws_merged.cell(row=row_idx, column=col_idx)
+            header.append(cell)
+        ws_merged.append(header)
+
+        # NaN -> celda vacía (igual que to_excel)
+        df_values = df_exist.astype(object).where(df_exist.notna(), None)
+        for values in df_values.itertuples(index=False, name=None):
+            row = []
+            for col_idx, value in enumerate(values):
+                cell = WriteOnlyCell(ws_merged, value=value)
                 cell.fill = data_fill
-                cell.font = data_font
-                
-                # Primera columna (índice) en bold
-                if col_idx == 1:
-                    cell.font = Font(name="Aptos Narrow", bold=True, size=11)
-        
+                cell.font = first_col_font if col_idx == 0 else data_font
+                row.append(cell)
+            ws_merged.append(row)
+
         # Guardar el archivo merged final
         wb_merged.save(merged_filepath)
-        os.remove(temp_file)  # Eliminar temporal
         
         # Renombrar el original
         if os.path.exists(renamed_original):
@@ -2,7 +2,8 @@
 Cliente para Google Places API.
 """
 import time
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional
 import requests
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
@@ -33,16 +34,52 @@ class PlacesAPIClient:
         self.base_url = "https://places.googleapis.com/v1"
         self.rate_limit_per_minute = rate_limit_per_minute
         self.min_delay_between_requests = 60.0 / rate_limit_per_minute  # segundos
-        self.last_request_time = 0
+        # Estado compartido entre hilos (process_batch usa varios workers)
+        self._rate_lock = threading.Lock()
+        self._current_rate = float(rate_limit_per_minute)  # req/min efectivas (AIMD)
+        self._next_request_time = 0.0
+        self._blocked_until = 0.0
     
     def _rate_limit_delay(self):
-        """Aplica delay para respetar rate limit."""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_delay_between_requests:
-            sleep_time = self.min_delay_between_requests - time_since_last
-            time.sleep(sleep_time)
-        self.last_request_time = time.time()
+        """Aplica delay para respetar rate limit.
+
+        Cada hilo reserva su turno bajo el lock y duerme fuera de él, así las
+        peticiones quedan espaciadas 60/rate segundos aunque haya varios workers.
+        """
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_request_time, self._blocked_until)
+            self._next_request_time = slot + 60.0 / self._current_rate
+        if slot > now:
+            time.sleep(slot - now)
+    
+    def _on_throttled(self, retry_after: Optional[str]):
+        """Respuesta 429: pausa según Retry-After y reduce el ritmo a la mitad."""
+        try:
+            pause = float(retry_after) if retry_after else 2.0
+        except ValueError:
+            pause = 2.0  # Retry-After en formato fecha: usar pausa por defecto
+        with self._rate_lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+            self._current_rate = max(self._current_rate * 0.5, 6.0)
+    
+    def _on_success(self):
+        """Recupera el ritmo de forma aditiva hasta el límite configurado."""
+        if self._current_rate < self.rate_limit_per_minute:
+            with self._rate_lock:
+                self._current_rate = min(self._current_rate + 10, self.rate_limit_per_minute)
+    
+    def _request(self, method: str, url: str, max_attempts: int = 3, **kwargs) -> requests.Response:
+        """Petición con rate limit; reintenta las respuestas 429 respetando Retry-After."""
+        for attempt in range(max_attempts):
+            self._rate_limit_delay()
+            r = requests.request(method, url, **kwargs)
+            if r.status_code != 429 or attempt == max_attempts - 1:
+                break
+            self._on_throttled(r.headers.get("Retry-After"))
+        r.raise_for_status()
+        self._on_success()
+        return r
     
     def text_search(self, query: str, limit: int = 120) -> List[Dict]:
         """Busca lugares usando text search (Nueva API)."""
@@ -51,8 +88,6 @@ class PlacesAPIClient:
         page_token = None
         
         while len(results) < limit:
-            self._rate_limit_delay()
-            
             payload = {
                 "textQuery": query,
                 "maxResultCount": min(20, limit - len(results))  # Nueva API limita a 20 por request
@@ -67,8 +102,7 @@ class PlacesAPIClient:
             }
             
             try:
-                r = requests.post(url, json=payload, headers=headers, timeout=10)
-                r.raise_for_status()
+                r = self._request("POST", url, json=payload, headers=headers, timeout=10)
                 data = r.json()
                 
                 if "places" in data:
@@ -92,8 +126,6 @@ class PlacesAPIClient:
     
     def place_details(self, place_id: str) -> Dict:
         """Obtiene detalles de un lugar específico (Nueva API)."""
-        self._rate_limit_delay()
-        
         url = f"{self.base_url}/places/{place_id}"
         
         headers = {
@@ -103,8 +135,7 @@ class PlacesAPIClient:
         }
         
         try:
-            r = requests.get(url, headers=headers, timeout=10)
-            r.raise_for_status()
+            r = self._request("GET", url, headers=headers, timeout=10)
             data = r.json()
             
             # Normalizar respuesta para compatibilidad con código existente
@@ -3,6 +3,7 @@ Detector de duplicados.
 Implementa IDuplicateDetector siguiendo SRP.
 """
 from typing import List, Dict, Any
+import numpy as np
 import pandas as pd
 from difflib import SequenceMatcher
 
@@ -46,22 +47,28 @@ class DuplicateDetector(IDuplicateDetector):
                 self._logger.warning("No se encontró campo de nombre para detección de duplicados")
                 return duplicates_mask
 
+            # Nombres/direcciones normalizados una sola vez, por posición (sin
+            # construir una Series por fila ni hacer data.loc por cada par)
+            names = [str(v).strip().lower() for v in data[name_field]]
+            addresses = ([str(v).strip().lower() for v in data[address_field]]
+                         if address_field else [''] * len(data))
+            is_duplicate = [False] * len(data)
+
             # Procesar cada registro
-            for idx, row in data.iterrows():
-                if duplicates_mask[idx]:
+            for pos, idx in enumerate(data.index):
+                if is_duplicate[pos]:
                     continue  # Ya marcado como duplicado
 
-                current_name = str(row.get(name_field, '')).strip().lower()
-                current_address = str(row.get(address_field, '')).strip().lower() if address_field else ''
+                current_name = names[pos]
+                current_address = addresses[pos]
 
                 # Comparar con registros posteriores
-                for compare_idx in data.index[data.index > idx]:
-                    if duplicates_mask[compare_idx]:
+                for compare_pos in np.flatnonzero(data.index > idx):
+                    if is_duplicate[compare_pos]:
                         continue
 
-                    compare_name = str(data.loc[compare_idx, name_field]).strip().lower()
-                    compare_address = (str(data.loc[compare_idx, address_field]).strip().lower()
-                                     if address_field else '')
+                    compare_name = names[compare_pos]
+                    compare_address = addresses[compare_pos]
 
                     # Calcular similitud
                     name_similarity = self._calculate_similarity(current_name, compare_name)
@@ -75,10 +82,12 @@ class DuplicateDetector(IDuplicateDetector):
                         # Considerar duplicado si nombre es muy similar y dirección también (o no hay dirección)
                         if (not current_address or not compare_address or
                             address_similarity >= self._similarity_threshold):
-                            duplicates_mask[compare_idx] = True
+                            is_duplicate[compare_pos] = True
                             self._logger.debug(f"Duplicado detectado: '{current_name}' ~ '{compare_name}' "
                                              f"(similitud: {name_similarity:.2f})")
 
+            duplicates_mask = pd.Series(is_duplicate, index=data.index)
+
             duplicate_count = duplicates_mask.sum()
             self._logger.info(f"Detectados {duplicate_count} registros duplicados")
 
@@ -114,9 +123,13 @@ class DuplicateDetector(IDuplicateDetector):
             if not name_field:
                 return similar_businesses
 
-            for _, row in data.iterrows():
-                name = str(row.get(name_field, '')).strip().lower()
-                address = str(row.get(address_field, '')).strip().lower() if address_field else ''
+            columns = list(data.columns)
+            name_pos = columns.index(name_field)
+            address_pos = columns.index(address_field) if address_field else None
+
+            for values in data.itertuples(index=False, name=None):
+                name = str(values[name_pos]).strip().lower()
+                address = str(values[address_pos]).strip().lower() if address_field else ''
 
                 name_similarity = self._calculate_similarity(target_name, name)
                 address_similarity = (self._calculate_similarity(target_address, address)
@@ -126,7 +139,7 @@ class DuplicateDetector(IDuplicateDetector):
                 if name_similarity >= 0.7:
                     similarity_score = (name_similarity + address_similarity) / 2 if address_similarity > 0 else name_similarity
 
-                    similar_business = row.to_dict()
+                    similar_business = dict(zip(columns, values))
                     similar_business['_similarity_score'] = similarity_score
                     similar_businesses.append(similar_business)
 
@@ -141,6 +154,33 @@ class DuplicateDetector(IDuplicateDetector):
             self._logger.error("Error buscando negocios similares", exc=e)
             raise
 
+    def find_duplicates(self, new_data: List[Dict], existing_data: List[Dict]) -> Dict:
+        """
+        Encuentra los registros nuevos que ya existen (nombre/dirección similares).
+
+        Args:
+            new_data: Registros nuevos
+            existing_data: Registros existentes
+
+        Returns:
+            Diccionario {posición en new_data: registro existente más parecido}
+        """
+        existing = pd.DataFrame(existing_data)
+        duplicates = {}
+        if existing.empty:
+            return duplicates
+
+        for pos, item in enumerate(new_data):
+            similar = self.find_similar_businesses(existing, item)
+            if similar and similar[0]['_similarity_score'] >= self._similarity_threshold:
+                duplicates[pos] = similar[0]
+
+        return duplicates
+
+    def remove_duplicates(self, data: List[Dict], duplicates: Dict) -> List[Dict]:
+        """Quita de `data` las posiciones devueltas por find_duplicates."""
+        return [item for pos, item in enumerate(data) if pos not in duplicates]
+
     def _calculate_similarity(self, text1: str, text2: str) -> float:
         """Calcula similitud entre dos textos usando SequenceMatcher."""
         if not text1 or not text2:
@@ -156,6 +196,6 @@ class DuplicateDetector(IDuplicateDetector):
 
         for name in possible_names:
             if name.lower() in columns_lower:
-                return columns[columns_lower == name.lower()].iloc[0]
+                return columns[columns_lower == name.lower()][0]
 
         return None
\ No newline at end of file
@@ -1,7 +1,9 @@
 """
 Utilidades generales para el script de marketing.
 """
+import os
 import re
+from typing import List, Optional
 from urllib.parse import urlparse
 import tldextract
 
@@ -49,6 +51,40 @@ def clean_phone(phone: str) -> str:
     return cleaned
 
 
+def scan_excel_files(dir_path: str) -> List[os.DirEntry]:
+    """Lista los .xlsx/.xls de un directorio en una sola pasada de os.scandir.
+
+    Devuelve primero los .xlsx y luego los .xls (el orden de los dos glob que
+    reemplaza); [] si el directorio no existe. `entry.stat()` queda cacheado
+    en cada DirEntry, así que ordenar y mostrar reutilizan el mismo stat.
+    """
+    xlsx, xls = [], []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                ext = entry.name.rpartition('.')[2].lower()
+                if ext in ('xlsx', 'xls') and entry.is_file():
+                    (xlsx if ext == 'xlsx' else xls).append(entry)
+    except FileNotFoundError:
+        return []
+    return xlsx + xls
+
+
+def find_latest_output(dir_path: str = "data/output") -> Optional[str]:
+    """Ruta del Excel modificado más recientemente en data/output/ (None si no hay)."""
+    # max() en una pasada en lugar de ordenar todo; stat cacheado en el DirEntry
+    latest = max(scan_excel_files(dir_path), key=lambda entry: entry.stat().st_mtime, default=None)
+    return latest.path if latest is not None else None
+
+
+def find_input_excel(dir_path: str = "data/input") -> Optional[str]:
+    """Ruta del Excel maestro en data/input/ (el primero encontrado, None si no hay)."""
+    excel_files = scan_excel_files(dir_path)
+    if excel_files:
+        return excel_files[0].path
+    return None
+
+
 def safe_get(data: dict, *keys, default=""):
     """Obtiene un valor de un diccionario anidado de forma segura."""
     for key in keys:
@@ -20,10 +20,14 @@ normalize_url = utils_module.normalize_url
 validate_email = utils_module.validate_email
 clean_phone = utils_module.clean_phone
 same_registrable_domain = utils_module.same_registrable_domain
+scan_excel_files = utils_module.scan_excel_files
+find_latest_output = utils_module.find_latest_output
+find_input_excel = utils_module.find_input_excel
 EMAIL_REGEX = utils_module.EMAIL_REGEX
 
 __all__ = [
     'Logger', 'logger',
     'safe_get', 'normalize_url', 'validate_email', 'clean_phone',
-    'same_registrable_domain', 'EMAIL_REGEX'
+    'same_registrable_domain', 'scan_excel_files', 'find_latest_output',
+    'find_input_excel', 'EMAIL_REGEX'
 ]
\ No newline at end of file
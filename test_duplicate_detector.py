@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Test del detector de duplicados (DuplicateDetector)."""
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, 'src')
+from src.services.duplicate_detector import DuplicateDetector
+
+
+def test_detect_duplicates():
+    """detect_duplicates de punta a punta, con un índice desordenado."""
+    data = pd.DataFrame(
+        {
+            'Name': ['Hotel Sol', 'Café Luna', 'hotel sol ', 'Bar X', 'Cafe Luna', 'Hotel Sol'],
+            'Address': ['Calle 1', 'Cra 2', 'calle 1', 'Cra 9', 'Cra 2', 'Av 50'],
+        },
+        index=[40, 10, 50, 20, 30, 60],
+    )
+    mask = DuplicateDetector().detect_duplicates(data)
+
+    # Se compara cada fila con las de índice mayor: 'Cafe Luna' (30) es copia
+    # de 'Café Luna' (10); 'hotel sol ' (50) es copia de 'Hotel Sol' (40) y el
+    # último 'Hotel Sol' (60) tiene otra dirección
+    expected = pd.Series([False, False, True, False, True, False], index=data.index)
+    assert mask.equals(expected), mask.to_dict()
+
+
+def test_find_and_remove_duplicates():
+    """find_duplicates/remove_duplicates entre registros nuevos y existentes."""
+    detector = DuplicateDetector()
+    existing = [{'name': 'Hotel Sol', 'address': 'Calle 1'}]
+    new = [{'name': 'Hotel Sol', 'address': 'Calle 1'}, {'name': 'Bar X', 'address': 'Cra 9'}]
+
+    duplicates = detector.find_duplicates(new, existing)
+    assert list(duplicates) == [0]
+    assert detector.remove_duplicates(new, duplicates) == [new[1]]
+
+
+if __name__ == "__main__":
+    test_detect_duplicates()
+    test_find_and_remove_duplicates()
+    print("✅ Test completado")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Test de la lectura de resultados y el merge en el Excel maestro (OutputWriter)."""
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, 'src')
+from src.output_writer import OutputWriter, merge_columns, read_xlsx_frame, read_xlsx_records
+
+
+MASTER = pd.DataFrame({
+    'Nombre': ['Hotel Sol', 'Café Luna'],
+    'WhatsApp': ['573001112233', 'N/A'],
+    'Telefono': ['6041234567', '6047654321'],
+    'Correo': ['sol@hotel.co', 'N/A'],
+    'Pagina Web': ['https://hotelsol.co', 'N/A'],
+    'Ciudad': ['Medellín', 'Medellín'],
+})
+
+# Sin web ni correo: write_to_excel los escribe como 'N/A'
+NEW_DATA = [
+    {'Nombre': 'Café Luna', 'Telefono': '6047654321', 'Correo': 'hola@luna.co', 'Ciudad': 'Medellín'},
+    {'Nombre': 'Bar X', 'Telefono': '6040000000', 'Ciudad': 'Medellín'},
+]
+
+
+def _merge(tmp_path, name, read):
+    """Merge de NEW_DATA (leído del archivo de salida con `read`) en una copia del maestro."""
+    workdir = tmp_path / name
+    workdir.mkdir()
+    master = workdir / 'master.xlsx'
+    output = workdir / 'output.xlsx'
+    MASTER.to_excel(master, index=False)
+    writer = OutputWriter(humanize=False)
+    writer.write_to_excel(NEW_DATA, str(output), use_template_columns=True)
+
+    merged_path, _ = writer.merge_into_existing_excel(
+        existing_filepath=str(master),
+        data=read(str(output), str(master)),
+        key_priority=['Pagina Web', 'Nombre'],
+        output_dir=str(workdir / 'merged'),
+    )
+    # Sin na_values: un 'N/A' literal escrito en el maestro debe verse como tal
+    return pd.read_excel(merged_path, dtype=str, keep_default_na=False)
+
+
+def test_merge_same_result_for_every_reader(tmp_path):
+    """El maestro fusionado no depende del lector usado para el archivo de salida."""
+    readers = {
+        'read_excel': lambda out, master: pd.read_excel(out).to_dict('records'),
+        'records': lambda out, master: read_xlsx_records(out),
+        'frame': lambda out, master: read_xlsx_frame(
+            out, columns=merge_columns(master, ['Pagina Web', 'Nombre'])),
+    }
+    merged = {name: _merge(tmp_path, name, read) for name, read in readers.items()}
+
+    expected = merged['read_excel']
+    for name, frame in merged.items():
+        pd.testing.assert_frame_equal(frame, expected, obj=name)
+
+    # Los 'N/A' del archivo de salida no llegan al maestro como texto
+    new_rows = expected[expected['Nombre'] == 'Bar X']
+    assert (new_rows[['Correo', 'Pagina Web']] == '').all().all()
+
+
+def test_read_xlsx_na_strings_as_none(tmp_path):
+    """Los textos NA de Excel se leen como None, igual que NaN en pd.read_excel."""
+    path = tmp_path / 'na.xlsx'
+    pd.DataFrame({'Nombre': ['Bar X'], 'Pagina Web': ['N/A'], 'Correo': ['']}).to_excel(path, index=False)
+
+    assert read_xlsx_records(str(path)) == [{'Nombre': 'Bar X', 'Pagina Web': None, 'Correo': None}]
+    assert read_xlsx_frame(str(path), columns={'Pagina Web'})['Pagina Web'].isna().all()
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))